@@ -1,49 +1,154 @@
 import pygame
-import random
 
-class ThunderEffect:
-    def __init__(self, screen, duration=100, fade_duration=500):
+# Transiciones entre carpetas controladas por el tiempo. Ninguna bloquea el
+# bucle: update() avanza el estado y avisa del momento exacto de cambiar de
+# carpeta, y draw() pinta la capa de la transición sobre el fotograma ya
+# compuesto. Las superficies que necesitan (destello blanco, fotograma de la
+# carpeta entrante) se preparan al empezar, en el formato de la pantalla.
+
+FLASH_COLOR = (255, 255, 255)
+
+
+class Transition:
+    # Si es True, start() necesita un fotograma ya compuesto de la carpeta entrante
+    needs_incoming_frame = False
+
+    def __init__(self, screen, duration=600):
         self.screen = screen
         self.duration = duration
-        self.fade_duration = fade_duration
         self.start_time = None
         self.active = False
-        self.phase = 0
-        self.thunder_count = 0
+        self.swapped = False
+        self.flash = self.prepare_surface(pygame.Surface(screen.get_size()))
+        self.flash.fill(FLASH_COLOR)
+
+    def prepare_surface(self, surface):
+        if pygame.display.get_surface() is not None:
+            return surface.convert()
+        return surface
 
-    def start(self):
-        self.start_time = pygame.time.get_ticks()
+    def start(self, incoming_frame=None, now=None):
+        self.start_time = pygame.time.get_ticks() if now is None else now
         self.active = True
-        self.phase = 1
-        self.thunder_count = 0
+        self.swapped = False
+
+    def elapsed(self, now=None):
+        return (pygame.time.get_ticks() if now is None else now) - self.start_time
+
+    def swap_time(self):
+        # Milisegundos desde el inicio en los que se cambia de carpeta
+        return self.duration / 2
+
+    def update(self, now=None):
+        # Devuelve True una sola vez, cuando toca mostrar la carpeta nueva
+        if not self.active:
+            return False
+        elapsed = self.elapsed(now)
+        if elapsed >= self.duration:
+            self.active = False
+        if not self.swapped and elapsed >= self.swap_time():
+            self.swapped = True
+            return True
+        return False
+
+    def draw(self, screen, now=None):
+        pass
+
+    def draw_flash(self, screen, strength):
+        alpha = int(255 * max(0.0, min(1.0, strength)))
+        if alpha:
+            self.flash.set_alpha(alpha)
+            screen.blit(self.flash, (0, 0))
+
+
+class FlashTransition(Transition):
+    # Sube a blanco, cambia de carpeta en el pico y se desvanece sobre la nueva
+
+    def draw(self, screen, now=None):
+        if self.active:
+            progress = self.elapsed(now) / self.duration
+            self.draw_flash(screen, 1 - abs(2 * progress - 1))
+
 
-    def draw_lightning(self):
-        start_pos = (random.randint(0, self.screen.get_width()), 0)
-        end_pos = (random.randint(0, self.screen.get_width()), self.screen.get_height())
-        pygame.draw.line(self.screen, (255, 255, 255), start_pos, end_pos, 2)
+class CrossfadeTransition(Transition):
+    # Funde un fotograma de la carpeta entrante sobre la actual y cambia al final
+    needs_incoming_frame = True
 
-    def update(self, new_folder, current_folder, screen):
+    def __init__(self, screen, duration=800):
+        super().__init__(screen, duration)
+        self.incoming = None
+
+    def start(self, incoming_frame=None, now=None):
+        super().start(incoming_frame, now)
+        self.incoming = self.prepare_surface(incoming_frame.copy()) if incoming_frame is not None else None
+
+    def swap_time(self):
+        return self.duration
+
+    def update(self, now=None):
+        swap = super().update(now)
+        if swap:
+            self.incoming = None
+        return swap
+
+    def draw(self, screen, now=None):
+        if self.active and self.incoming is not None:
+            self.incoming.set_alpha(int(255 * min(1.0, self.elapsed(now) / self.duration)))
+            screen.blit(self.incoming, (0, 0))
+
+
+class ThunderEffect(Transition):
+    # Varios rayos seguidos, cada uno con su destello. El cambio de carpeta
+    # ocurre en el último destello, cuando la pantalla está en blanco.
+
+    def __init__(self, screen, lightning_manager=None, duration=250, fade_duration=300, strikes=3):
+        super().__init__(screen, strikes * (duration + fade_duration))
+        self.strike_duration = duration
+        self.fade_duration = fade_duration
+        self.strikes = strikes
+        self.lightning_manager = lightning_manager
+        self.strike = -1
+        self.sprite = None
+
+    def start(self, incoming_frame=None, now=None):
+        super().start(incoming_frame, now)
+        self.strike = -1
+        self.sprite = None
+
+    def swap_time(self):
+        return self.duration - self.fade_duration
+
+    def update(self, now=None):
+        if self.active:
+            strike = int(self.elapsed(now) // (self.strike_duration + self.fade_duration))
+            if strike != self.strike and strike < self.strikes:
+                # Relámpago nuevo en cada golpe; si aún no hay ninguno, solo destello
+                self.strike = strike
+                lightning = self.lightning_manager.get_random_lightning() if self.lightning_manager else None
+                self.sprite = self.lightning_manager.get_sprite(lightning) if lightning is not None else None
+        return super().update(now)
+
+    def draw(self, screen, now=None):
         if not self.active:
-            return current_folder
-
-        current_time = pygame.time.get_ticks()
-        elapsed_time = current_time - self.start_time
-
-        if self.phase == 1:
-            if elapsed_time <= self.duration:
-                self.draw_lightning()
-            else:
-                screen.fill((255, 255, 255))  # Pantalla en blanco
-                self.phase = 2
-                self.start_time = current_time
-        elif self.phase == 2 and elapsed_time > self.duration:
-            self.thunder_count += 1
-            if self.thunder_count >= 3:
-                self.active = False
-                self.phase = 0
-                return new_folder
-            else:
-                self.phase = 1
-                self.start_time = current_time
-
-        return current_folder
+            return
+        position = self.elapsed(now) % (self.strike_duration + self.fade_duration)
+        if position < self.strike_duration:
+            if self.sprite is not None:
+                self.sprite.draw(screen, position / self.strike_duration)
+        else:
+            self.draw_flash(screen, 1 - (position - self.strike_duration) / self.fade_duration)
+
+
+TRANSITIONS = {
+    "flash": FlashTransition,
+    "crossfade": CrossfadeTransition,
+    "lightning": ThunderEffect,
+}
+
+
+def create_transition(name, screen, lightning_manager=None):
+    if name not in TRANSITIONS:
+        raise ValueError(f"Transición desconocida: {name}")
+    if name == "lightning":
+        return ThunderEffect(screen, lightning_manager)
+    return TRANSITIONS[name](screen)
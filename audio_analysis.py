@@ -0,0 +1,95 @@
+import collections
+import time
+
+import numpy as np
+
+# Análisis de audio vectorizado: el callback de captura escribe en un búfer
+# circular preasignado y un hilo de análisis calcula, a su propio ritmo, los
+# valores que consume la visualización.
+
+# Resultado de un análisis. Se publica como una tupla inmutable, de modo que
+# leerlo desde el bucle principal no necesita bloqueos.
+AudioFeatures = collections.namedtuple("AudioFeatures", ["volume", "rms", "peak", "bass", "mid", "treble", "onset", "beat", "time"])
+
+SILENCE = AudioFeatures(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, False, 0.0)
+
+# Límites de las bandas de frecuencia en Hz
+BANDS = {"bass": (20, 250), "mid": (250, 4000), "treble": (4000, 16000)}
+
+
+class RingBuffer:
+    # Búfer circular de muestras float32 con un único escritor (el callback de audio)
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.float32)
+        self.write_index = 0  # Total de muestras escritas; se publica después de copiar los datos
+
+    def write(self, samples):
+        samples = samples[-self.capacity:]
+        start = self.write_index % self.capacity
+        end = start + len(samples)
+        if end <= self.capacity:
+            self.data[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.data[start:] = samples[:split]
+            self.data[:end - self.capacity] = samples[split:]
+        self.write_index += len(samples)
+
+    def latest(self, out):
+        # Copia en 'out' las últimas len(out) muestras en orden cronológico
+        n = len(out)
+        end = self.write_index % self.capacity
+        start = end - n
+        if start >= 0:
+            out[:] = self.data[start:end]
+        else:
+            out[:-start] = self.data[start:]
+            out[-start:] = self.data[:end]
+        return out
+
+
+class AudioAnalyzer:
+    def __init__(self, sample_rate, window_size=2048, onset_history=43, onset_sensitivity=1.5, min_beat_interval=0.25):
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.window = np.hanning(window_size).astype(np.float32)
+        self.samples = np.zeros(window_size, dtype=np.float32)
+        self.weighted = np.zeros(window_size, dtype=np.float32)
+        # Normaliza las magnitudes para que una sinusoide de amplitud A dé A
+        self.magnitude_scale = 2.0 / self.window.sum()
+
+        frequencies = np.fft.rfftfreq(window_size, 1.0 / sample_rate)
+        self.band_bins = {name: np.flatnonzero((frequencies >= low) & (frequencies < high)) for name, (low, high) in BANDS.items()}
+        self.previous_magnitudes = np.zeros(len(frequencies), dtype=np.float32)
+
+        # Detección de golpes por flujo espectral con umbral adaptativo
+        self.flux_history = np.zeros(onset_history, dtype=np.float32)
+        self.flux_count = 0
+        self.onset_sensitivity = onset_sensitivity
+        self.min_beat_interval = min_beat_interval
+        self.last_beat = -min_beat_interval
+
+    def analyze(self, ring_buffer, now=None):
+        now = time.perf_counter() if now is None else now
+        samples = ring_buffer.latest(self.samples)
+        peak = float(np.abs(samples).max())
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+
+        np.multiply(samples, self.window, out=self.weighted)
+        magnitudes = np.abs(np.fft.rfft(self.weighted)).astype(np.float32) * self.magnitude_scale
+        # Amplitud equivalente de cada banda (la ventana de Hann reparte la energía en 1.5 bins)
+        bands = {name: float(np.sqrt(np.dot(magnitudes[bins], magnitudes[bins]) / 1.5)) for name, bins in self.band_bins.items()}
+
+        flux = float(np.maximum(magnitudes - self.previous_magnitudes, 0).sum())
+        self.previous_magnitudes = magnitudes
+        history = self.flux_history[:min(self.flux_count, len(self.flux_history))]
+        threshold = history.mean() + self.onset_sensitivity * history.std() if len(history) else np.inf
+        beat = flux > threshold and flux > 1e-4 and now - self.last_beat >= self.min_beat_interval
+        if beat:
+            self.last_beat = now
+        self.flux_history[self.flux_count % len(self.flux_history)] = flux
+        self.flux_count += 1
+
+        return AudioFeatures(peak, rms, peak, bands["bass"], bands["mid"], bands["treble"], flux, bool(beat), now)
@@ -0,0 +1,214 @@
+import threading
+import time
+import wave
+
+import numpy as np
+
+# Fuentes de audio intercambiables. Todas entregan al callback bloques mono
+# float32 en [-1, 1] de block_size muestras, de modo que el análisis no depende
+# del origen: micrófono (PyAudio o sounddevice), fichero WAV o señal sintética.
+
+
+class AudioSource:
+    name = "base"
+
+    def __init__(self, sample_rate=44100, channels=1, block_size=512):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.callback = None
+        self.blocks = 0  # Bloques entregados, para comparar fuentes
+
+    def start(self, callback):
+        self.callback = callback
+
+    def stop(self):
+        pass
+
+    @property
+    def latency(self):
+        # Segundos entre la captura de una muestra y su entrega al callback
+        return self.block_size / self.sample_rate
+
+    def deliver(self, samples):
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1, dtype=np.float32)
+        self.blocks += 1
+        self.callback(samples)
+
+
+class PyAudioSource(AudioSource):
+    name = "pyaudio"
+
+    def start(self, callback):
+        import pyaudio
+
+        super().start(callback)
+        self.pyaudio = pyaudio
+        self.p = pyaudio.PyAudio()
+        self.stream = self.p.open(format=pyaudio.paInt16,
+                                  channels=self.channels,
+                                  rate=self.sample_rate,
+                                  input=True,
+                                  frames_per_buffer=self.block_size,
+                                  stream_callback=self.stream_callback)
+
+    def stream_callback(self, in_data, frame_count, time_info, status):
+        audio_data = np.frombuffer(in_data, dtype=np.int16).reshape(-1, self.channels)
+        self.deliver(audio_data.astype(np.float32) / 32768)
+        return None, self.pyaudio.paContinue
+
+    @property
+    def latency(self):
+        return super().latency + self.stream.get_input_latency()
+
+    def stop(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.p.terminate()
+
+
+class SoundDeviceSource(AudioSource):
+    name = "sounddevice"
+
+    def start(self, callback):
+        import sounddevice as sd
+
+        super().start(callback)
+        self.stream = sd.InputStream(samplerate=self.sample_rate, channels=self.channels,
+                                     blocksize=self.block_size, dtype="float32",
+                                     callback=self.stream_callback)
+        self.stream.start()
+
+    def stream_callback(self, indata, frames, time_info, status):
+        self.deliver(indata.copy())
+
+    @property
+    def latency(self):
+        return super().latency + self.stream.latency
+
+    def stop(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+class GeneratedSource(AudioSource):
+    # Fuente que produce sus propios bloques en un hilo, a ritmo real o lo más rápido posible
+
+    def __init__(self, sample_rate=44100, channels=1, block_size=512, realtime=True):
+        super().__init__(sample_rate, channels, block_size)
+        self.realtime = realtime
+        self.running = False
+        self.thread = None
+
+    def read_block(self):
+        raise NotImplementedError
+
+    def start(self, callback):
+        super().start(callback)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        period = self.block_size / self.sample_rate
+        next_block = time.perf_counter()
+        while self.running:
+            samples = self.read_block()
+            if samples is None:
+                break
+            self.deliver(samples)
+            if self.realtime:
+                next_block += period
+                time.sleep(max(0, next_block - time.perf_counter()))
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+class WavFileSource(GeneratedSource):
+    name = "wav"
+
+    def __init__(self, path, block_size=512, realtime=True, loop=True):
+        self.path = path
+        self.loop = loop
+        self.samples, sample_rate = read_wav(path)
+        super().__init__(sample_rate, 1, block_size, realtime)
+        self.position = 0
+
+    def read_block(self):
+        if self.position >= len(self.samples):
+            if not self.loop:
+                return None
+            self.position = 0
+        block = self.samples[self.position:self.position + self.block_size]
+        self.position += self.block_size
+        if len(block) < self.block_size:
+            block = np.pad(block, (0, self.block_size - len(block)))
+        return block
+
+
+class SyntheticSource(GeneratedSource):
+    # Señal determinista: bombo a 'bpm', hi-hat de ruido en los contratiempos y un
+    # acorde suave de fondo
+
+    name = "synthetic"
+
+    def __init__(self, sample_rate=44100, block_size=512, realtime=True, bpm=120, seed=0):
+        super().__init__(sample_rate, 1, block_size, realtime)
+        self.bpm = bpm
+        self.rng = np.random.default_rng(seed)
+        self.position = 0
+
+    def read_block(self):
+        t = (self.position + np.arange(self.block_size)) / self.sample_rate
+        self.position += self.block_size
+        beat = 60.0 / self.bpm
+        phase = np.mod(t, beat)
+        kick = 0.8 * np.sin(2 * np.pi * (50 + 100 * np.exp(-phase * 30)) * phase) * np.exp(-phase * 8)
+        offbeat = np.mod(t + beat / 2, beat)
+        hihat = 0.2 * self.rng.standard_normal(self.block_size) * np.exp(-offbeat * 40)
+        pad = 0.1 * (np.sin(2 * np.pi * 220 * t) + np.sin(2 * np.pi * 277.2 * t) + np.sin(2 * np.pi * 329.6 * t)) / 3
+        return (kick + hihat + pad).astype(np.float32)
+
+
+def read_wav(path):
+    # Lee un WAV PCM y lo devuelve como muestras mono float32 y su frecuencia de muestreo
+    with wave.open(path, "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        width = wav_file.getsampwidth()
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        values = raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16)
+        samples = np.where(values >= 1 << 23, values - (1 << 24), values).astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Formato WAV no soportado: {width * 8} bits")
+    return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32), sample_rate
+
+
+AUDIO_SOURCES = {
+    "pyaudio": PyAudioSource,
+    "sounddevice": SoundDeviceSource,
+    "synthetic": SyntheticSource,
+}
+
+
+def create_audio_source(name, wav_path=None, **kwargs):
+    if name == "wav":
+        if not wav_path:
+            raise ValueError("La fuente 'wav' necesita la ruta del fichero")
+        return WavFileSource(wav_path, **kwargs)
+    if name not in AUDIO_SOURCES:
+        raise ValueError(f"Fuente de audio desconocida: {name}")
+    return AUDIO_SOURCES[name](**kwargs)
@@ -0,0 +1,50 @@
+import argparse
+import time
+
+from audio_sources import create_audio_source
+from main import AudioProcessor
+
+# Compara las fuentes de audio: bloques entregados por segundo, latencia de
+# entrega y CPU del proceso mientras se captura y se analiza.
+#
+#   python -m benchmarks.audio_backends --sources synthetic wav --wav musica.wav
+
+
+def measure(name, wav_path, seconds, block_size):
+    source = create_audio_source(name, wav_path=wav_path, block_size=block_size)
+    processor = AudioProcessor(buffer_size=block_size, source=source)
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    processor.start()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    latency = source.latency
+    processor.stop()
+    return {
+        "blocks_per_second": source.blocks / wall,
+        "latency_ms": latency * 1000,
+        "cpu_percent": 100 * cpu / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de fuentes de audio")
+    parser.add_argument("--sources", nargs="+", default=["synthetic"],
+                        choices=["pyaudio", "sounddevice", "wav", "synthetic"])
+    parser.add_argument("--wav", help="Fichero WAV para la fuente 'wav'")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--block-size", type=int, default=512)
+    args = parser.parse_args()
+
+    for name in args.sources:
+        try:
+            result = measure(name, args.wav, args.seconds, args.block_size)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"{name:12s} no disponible: {e}")
+            continue
+        print(f"{name:12s} {result['blocks_per_second']:8.1f} bloques/s  "
+              f"latencia {result['latency_ms']:6.1f} ms  CPU {result['cpu_percent']:5.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from audio_sources import SyntheticSource
+from effects import EFFECTS, EffectsPipeline
+from render import SimulatedAudio
+
+# Coste por fotograma de los efectos de píxel sobre un fotograma compuesto,
+# con audio sintético. Cada combinación se compara con el presupuesto y se
+# indica la memoria reservada por fotograma una vez en marcha.
+#
+#   python -m benchmarks.effects --budget-ms 8
+
+COMBINATIONS = [(name,) for name in EFFECTS] + [EFFECTS]
+
+
+def benchmark(surface, enabled, frames, fps):
+    pipeline = EffectsPipeline(surface.get_size(), enabled)
+    audio = SimulatedAudio(SyntheticSource(realtime=False), fps)
+    features = [audio.next_features() for _ in range(frames)]
+    durations = []
+    for i, frame_features in enumerate(features):
+        if i == frames // 2:
+            tracemalloc.start()
+        pipeline.update(frame_features)
+        start = time.perf_counter()
+        pipeline.apply(surface)
+        durations.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    values_ms = np.asarray(durations) * 1000
+    return {p: float(np.percentile(values_ms, p)) for p in (50, 95, 99)}, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los efectos de píxel")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600])
+    parser.add_argument("--budget-ms", type=float, default=8.0, help="Máximo por fotograma (p95) con todos los efectos")
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode(tuple(args.size))
+    surface = pygame.Surface(tuple(args.size)).convert(screen)
+    pixels = pygame.surfarray.pixels3d(surface)
+    pixels[...] = np.random.default_rng(0).integers(0, 256, pixels.shape, dtype=np.uint8)
+    del pixels
+
+    within_budget = True
+    for enabled in COMBINATIONS:
+        percentiles, peak = benchmark(surface, enabled, args.frames, args.fps)
+        print(f"{'+'.join(enabled):38s} p50 {percentiles[50]:.2f} ms  p95 {percentiles[95]:.2f} ms  "
+              f"p99 {percentiles[99]:.2f} ms  memoria reservada {peak / 1024:.1f} KB")
+        if enabled == EFFECTS:
+            within_budget = percentiles[95] <= args.budget_ms
+    print(f"Todos los efectos {'dentro' if within_budget else 'FUERA'} del presupuesto de {args.budget_ms:.1f} ms")
+    pygame.quit()
+    return 0 if within_budget else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
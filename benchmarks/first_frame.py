@@ -0,0 +1,49 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# Tiempo hasta el primer fotograma, medido en intérpretes nuevos: cada
+# ejecución importa main desde cero, abre la pantalla (ficticia), muestra la
+# pantalla de carga y sale al componer el primer fotograma de la primera
+# carpeta. Los tiempos cuentan desde el inicio de la importación de main.
+#
+#   python -m benchmarks.first_frame --runs 5
+
+# Los registros de las pre-cargas siguen saliendo después de main(): el resultado va en su propia línea marcada
+RESULT_PREFIX = "FIRST_FRAME_RESULT "
+
+RUN = f"""
+import json
+from audio_sources import SyntheticSource
+import main
+print({RESULT_PREFIX!r} + json.dumps(main.main(SyntheticSource(), watch=False, exit_after_first_frame=True)), flush=True)
+"""
+
+
+def measure(runs):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", RUN], env=env, capture_output=True, text=True, check=True).stdout
+        line = next(line for line in output.splitlines() if line.startswith(RESULT_PREFIX))
+        results.append(json.loads(line[len(RESULT_PREFIX):]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del tiempo hasta el primer fotograma")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    for key, label in (("loading_screen", "Pantalla de carga"), ("first_frame", "Primer fotograma")):
+        values_ms = np.asarray([result[key] for result in results]) * 1000
+        print(f"{label}: p50 {np.percentile(values_ms, 50):.0f} ms  min {values_ms.min():.0f} ms  max {values_ms.max():.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
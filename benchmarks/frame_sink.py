@@ -0,0 +1,81 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from framesink import FrameReader, FrameSink
+
+# Coste de publicar un fotograma en la salida de memoria compartida y lo que
+# ve un lector en otro proceso mientras el visualizador publica a los FPS
+# objetivo. El lector recorre cada fotograma entero (como haría un envío a un
+# muro LED) y cuenta los perdidos y los sobrescritos mientras los leía.
+#
+#   python -m benchmarks.frame_sink --frames 600 --fps 60
+
+
+def read_frames(name, results):
+    reader = FrameReader(name)
+    received = lost = invalid = 0
+    while True:
+        previous = reader.last_sequence
+        frame = reader.wait(timeout=2)
+        if frame is None:
+            break
+        if previous:
+            lost += frame.sequence - previous - 1
+        int(frame.pixels.sum(dtype=np.uint64))
+        received += 1
+        if not reader.is_valid(frame):
+            invalid += 1
+    frame = None
+    reader.close()
+    results.put((received, lost, invalid))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la salida de fotogramas en memoria compartida")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600])
+    parser.add_argument("--slots", type=int, default=3)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode(tuple(args.size))
+    surface = pygame.Surface(tuple(args.size)).convert(screen)
+    sink = FrameSink(tuple(args.size), name=f"vis_bench_{os.getpid()}", slots=args.slots)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    reader = context.Process(target=read_frames, args=(sink.name, results))
+    reader.start()
+    time.sleep(1)  # Arranque del lector
+
+    durations = []
+    try:
+        for number in range(args.frames):
+            frame_start = time.perf_counter()
+            surface.fill((number % 256, 0, 0))
+            start = time.perf_counter()
+            sink.publish(surface)
+            durations.append(time.perf_counter() - start)
+            time.sleep(max(0.0, 1 / args.fps - (time.perf_counter() - frame_start)))
+    finally:
+        sink.close()
+    received, lost, invalid = results.get()
+    reader.join()
+    pygame.quit()
+
+    values_ms = np.asarray(durations) * 1000
+    print(f"Publicar {args.size[0]}x{args.size[1]}: p50 {np.percentile(values_ms, 50):.2f} ms  "
+          f"p95 {np.percentile(values_ms, 95):.2f} ms  p99 {np.percentile(values_ms, 99):.2f} ms")
+    print(f"Lector: {received}/{args.frames} fotogramas, {lost} perdidos, {invalid} sobrescritos durante la lectura")
+
+
+if __name__ == "__main__":
+    main()
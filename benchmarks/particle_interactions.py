@@ -0,0 +1,69 @@
+import argparse
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+
+from interactions import MAX_PER_CELL, MAX_STRIDE, OVERLOAD_STRIDE
+from particles import ParticleSystem
+
+# Coste por paso de las interacciones entre partículas con miles de ellas. Con
+# la rejilla, cada paso debe quedarse cerca del presupuesto configurado: si no
+# cabe, las partículas se atienden por turnos (stride) hasta MAX_STRIDE, después
+# se miran menos vecinos por celda y, por último, el stride sigue creciendo hasta
+# OVERLOAD_STRIDE. Se indica qué recuentos siguen sin caber (p95 por encima del
+# presupuesto).
+#
+#   python -m benchmarks.particle_interactions --counts 1000 5000 10000
+
+GROUP = {"color": "random", "size_min": 2, "size_max": 6, "velocity_range": [1, 3]}
+INTERACTIONS = {
+    "radius": 30,
+    "budget_ms": 2.0,
+    "collision": {"strength": 0.5},
+    "flocking": {"separation": 0.6, "alignment": 0.1, "cohesion": 0.05},
+    "attraction": {"strength": 0.4, "decay": 0.92},
+}
+
+
+def benchmark(count, steps, size, budget_ms):
+    interactions = dict(INTERACTIONS, budget_ms=budget_ms)
+    particles = ParticleSystem([GROUP], count, size, rng=np.random.default_rng(0), interactions=interactions)
+    durations = []
+    for step in range(steps):
+        if step % 15 == 0:
+            particles.pulse_attraction()
+        particles.update()
+        durations.append(particles.interactions.last_duration)
+    # Se descarta el arranque, mientras el stride se ajusta
+    values_ms = np.asarray(durations[steps // 4:]) * 1000
+    return {p: float(np.percentile(values_ms, p)) for p in (50, 95, 99)}, particles.interactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las interacciones entre partículas")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=INTERACTIONS["budget_ms"])
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600])
+    args = parser.parse_args()
+
+    print(f"Presupuesto: {args.budget_ms:.1f} ms por paso, stride máximo {MAX_STRIDE} ({OVERLOAD_STRIDE} en sobrecarga), "
+          f"{MAX_PER_CELL} vecinos por celda")
+    missed = []
+    for count in args.counts:
+        percentiles, interactions = benchmark(count, args.steps, tuple(args.size), args.budget_ms)
+        within_budget = percentiles[95] <= args.budget_ms
+        if not within_budget:
+            missed.append(count)
+        print(f"{count:6d} partículas: p50 {percentiles[50]:.2f} ms  p95 {percentiles[95]:.2f} ms  "
+              f"p99 {percentiles[99]:.2f} ms  stride {interactions.stride}  "
+              f"{interactions.per_cell} por celda  {'dentro' if within_budget else 'FUERA'} del presupuesto")
+    if missed:
+        print(f"Fuera del presupuesto con {', '.join(str(count) for count in missed)} partículas")
+    return 1 if missed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
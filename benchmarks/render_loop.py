@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import platform
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from audio_sources import SyntheticSource, WavFileSource
+from compositor import Compositor
+from main import ImageFolder, apply_audio_features, get_folders_in_directory
+from quality import QUALITY_LEVELS, get_quality_level
+from render import SimulatedAudio
+
+# Benchmark sin pantalla del bucle de render. Compone N fotogramas por carpeta con
+# el mismo Compositor que el bucle en directo (rectángulos sucios incluidos), con
+# audio sintético o de un WAV alimentado a ritmo simulado de 30 FPS, y guarda los
+# percentiles de tiempo por etapa en un JSON que se puede comparar entre
+# ejecuciones.
+#
+#   python -m benchmarks.render_loop --frames 300 --output bench_output.json
+#   python -m benchmarks.render_loop --quality alta media baja mínima
+#
+# Con varios niveles de calidad, "overall" y "folders" son los del primero y
+# "quality_levels" resume todos.
+
+STAGES = ["audio", "particle_update", "background_fetch", "center_fetch", "background", "center", "particle_draw", "flip",
+          "frame"]
+DRAW_STAGES = ("background_fetch", "center_fetch", "background", "center", "particle_draw", "flip")  # Composición
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimes:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        result = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            values_ms = np.asarray(values) * 1000
+            result[stage] = {f"p{p}": round(float(np.percentile(values_ms, p)), 4) for p in PERCENTILES}
+            result[stage]["mean"] = round(float(values_ms.mean()), 4)
+        return result
+
+
+def benchmark_folder(screen, path, frames, audio, level=QUALITY_LEVELS[0]):
+    folder = ImageFolder(path, screen.get_size())
+    worker = folder.particle_thread
+    stats = StageTimes()
+    compositor = Compositor(screen, stats)
+    folder.apply_quality(level)
+    compositor.apply_quality(level)
+    for i in range(frames):
+        frame_start = time.perf_counter()
+        features = audio.next_features()
+        apply_audio_features(folder, features)
+        audio_done = time.perf_counter()
+
+        # La simulación avanza en este hilo para medirla aparte
+        worker.advance(audio.time)
+        update_done = time.perf_counter()
+        # Anota las etapas de dibujo y "flip"
+        compositor.compose(folder)
+        pygame.event.pump()
+        frame_end = time.perf_counter()
+
+        stats.record("audio", audio_done - frame_start)
+        stats.record("particle_update", update_done - audio_done)
+        stats.record("frame", frame_end - frame_start)
+    folder.stop_particle_thread()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sin pantalla del bucle de render")
+    parser.add_argument("--frames", type=int, default=300, help="Fotogramas por carpeta")
+    parser.add_argument("--directories", nargs="+", default=["images", "Pruebas"])
+    parser.add_argument("--wav", help="WAV grabado; si no se indica se usa audio sintético")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600])
+    parser.add_argument("--quality", nargs="+", default=[QUALITY_LEVELS[0].name],
+                        choices=[level.name for level in QUALITY_LEVELS], help="Niveles de calidad a medir")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode(tuple(args.size))
+
+    paths = [path for directory in args.directories for path in sorted(get_folders_in_directory(directory))]
+    levels = {}
+    for name in args.quality:
+        level = QUALITY_LEVELS[get_quality_level(name)]
+        results = {}
+        overall = StageTimes()
+        for path in paths:
+            # Cada carpeta recibe la misma señal desde el principio
+            source = WavFileSource(args.wav, realtime=False) if args.wav else SyntheticSource(realtime=False)
+            stats = benchmark_folder(screen, path, args.frames, SimulatedAudio(source, args.fps), level)
+            results[path] = stats.summary()
+            for stage, values in stats.samples.items():
+                overall.samples.setdefault(stage, []).extend(values)
+            frame = results[path]["frame"]
+            print(f"[{name}] {path}: p50 {frame['p50']:.2f} ms  p95 {frame['p95']:.2f} ms  p99 {frame['p99']:.2f} ms")
+        levels[name] = (overall.summary(), results)
+
+    if len(levels) > 1:
+        for name, (summary, _) in levels.items():
+            draw = sum(summary[stage]["mean"] for stage in DRAW_STAGES if stage in summary)
+            print(f"[{name}] fotograma p50 {summary['frame']['p50']:.2f} ms  p95 {summary['frame']['p95']:.2f} ms  "
+                  f"composición media {draw:.2f} ms")
+
+    report = {
+        "meta": {
+            "frames_per_folder": args.frames,
+            "screen_size": args.size,
+            "audio": args.wav or "synthetic",
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "quality": args.quality,
+        },
+        "overall": levels[args.quality[0]][0],
+        "folders": levels[args.quality[0]][1],
+        "quality_levels": {name: summary for name, (summary, _) in levels.items()},
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Resultados guardados en {args.output}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import concurrent.futures
+import os
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from frame_cache import FrameCache
+from main import FolderLoaderManager, get_folders_in_directory, get_max_workers
+
+# Compara el tiempo de arranque en frío (sin caché de fotogramas) del cargador con
+# hilos y del modo con procesos, generando las rotaciones desde las imágenes, y
+# lo que tardan las mismas carpetas desde sus paquetes de escena.
+#
+#   python -m benchmarks.startup --directory images --folders 3
+
+
+def load_all(mode, folder_paths, screen_size, use_bundle=False):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        manager = FolderLoaderManager(folder_paths, screen_size, memory_budget=None, preload_mode=mode,
+                                      frame_cache=FrameCache(cache_dir), use_bundle=use_bundle)
+        timings = {}
+        start = time.perf_counter()
+        # Igual que el cargador original: todas las carpetas a la vez en un ThreadPoolExecutor
+        with concurrent.futures.ThreadPoolExecutor(max_workers=get_max_workers()) as executor:
+            futures = {executor.submit(manager.load_folder, path): path for path in folder_paths}
+            for future in concurrent.futures.as_completed(futures):
+                folder = future.result()
+                folder.stop_particle_thread()
+                timings[futures[future]] = time.perf_counter() - start
+        total = time.perf_counter() - start
+        manager.shutdown()
+    return total, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque: hilos frente a procesos")
+    parser.add_argument("--directory", default="images")
+    parser.add_argument("--folders", type=int, default=None, help="Número máximo de carpetas")
+    parser.add_argument("--modes", nargs="+", default=["thread", "process"])
+    parser.add_argument("--no-bundle", action="store_true", help="No mide la carga desde los paquetes de escena")
+    args = parser.parse_args()
+
+    screen_size = (800, 600)
+    pygame.init()
+    pygame.display.set_mode(screen_size)
+
+    folder_paths = sorted(get_folders_in_directory(args.directory))[:args.folders]
+    print(f"{len(folder_paths)} carpetas, {get_max_workers()} núcleos")
+    # Los modos de pre-carga solo se distinguen al generar las rotaciones: sin paquetes
+    runs = [(mode, mode, False) for mode in args.modes]
+    if not args.no_bundle:
+        runs.append(("paquete", "thread", True))
+    results = {}
+    for label, mode, use_bundle in runs:
+        results[label], timings = load_all(mode, folder_paths, screen_size, use_bundle)
+        for path, elapsed in sorted(timings.items(), key=lambda item: item[1]):
+            print(f"  [{label}] {path}: lista a los {elapsed:.2f} s")
+        print(f"[{label}] total: {results[label]:.2f} s")
+
+    if "thread" in results:
+        for label, total in results.items():
+            if label != "thread":
+                print(f"{label} frente a thread: x{results['thread'] / total:.2f}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
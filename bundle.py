@@ -0,0 +1,226 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from frames import RenderedFrame, center_ladder, frame_angles, performance_test, render_base_frame, render_rotated_frame, rotational_symmetry
+from logger import log_message
+from particles import validate_particle_config
+from rotation import keyframe_indices
+
+# Paquete de escena compilado por carpeta: fotogramas rotados del fondo (los
+# que pida su estrategia de rotación, más la imagen base si alguno se genera
+# bajo demanda), escalera de la imagen central y sprites de partículas ya escalados, todos en
+# píxeles BGRA (el orden de la superficie de pantalla habitual), junto con la
+# configuración de partículas validada. Se genera sin conexión con
+#
+#   python bundle.py images Pruebas
+#
+# y ImageFolder lo abre con un único mapeo en memoria, sin decodificar PNG ni
+# escalar nada al arrancar.
+
+BUNDLE_NAME = "scene.visb"
+BUNDLE_VERSION = 2
+MAGIC = b"VISB"
+# Cabecera: firma, versión y longitud del índice JSON que la sigue
+HEADER = struct.Struct("<4sII")
+PIXEL_FORMAT = "BGRA"
+
+# Paso entre niveles pre-escalados de la imagen central
+DEFAULT_CENTER_SCALE_STEP = 0.05
+
+
+def scene_settings(screen_size, center_scale_step):
+    # Ajustes que determinan el contenido del paquete; si cambian, el paquete no sirve
+    return {
+        "screen_size": list(screen_size),
+        "fps_background": 2,
+        "center_scale": 0.3,
+        "max_scale": 2.0,
+        "center_scale_step": center_scale_step,
+        "max_file_size": 1024 * 1024,
+        "max_resolution": 800 * 600,
+    }
+
+
+def bundle_path(folder_path):
+    return os.path.join(folder_path, BUNDLE_NAME)
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class SceneBundle:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # Copia en escritura, como la caché de fotogramas: las superficies comparten las páginas
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, meta_length = HEADER.unpack_from(self.mapped, 0)
+        if magic != MAGIC or version != BUNDLE_VERSION:
+            raise ValueError(f"{path}: formato de paquete desconocido")
+        self.meta = json.loads(bytes(self.mapped[HEADER.size:HEADER.size + meta_length]))
+        self.settings = self.meta["settings"]
+        self.config = self.meta["config"]
+        self.rotation_index = self.meta["rotation_index"]
+        self.rotation_angles = self.meta["rotation_angles"]
+        self.keyframes = self.meta["keyframes"]  # Fotograma al que corresponde cada uno de frames["background"]
+        self.center_size = tuple(self.meta["center_size"])
+
+        view = memoryview(self.mapped)
+        self.frames = {}
+        for name, entries in self.meta["frames"].items():
+            frames = []
+            for offset, width, height, x, y in entries:
+                end = offset + width * height * 4
+                if end > len(self.mapped):
+                    raise ValueError(f"{path}: paquete truncado")
+                frames.append(RenderedFrame(view[offset:end], (width, height), (x, y), self.meta["format"]))
+            self.frames[name] = frames
+
+    def sprite_variants(self):
+        # Sprites por grupo de partículas, indexados por tamaño desde size_min
+        return {int(name.split("/")[1]): frames for name, frames in self.frames.items() if name.startswith("sprites/")}
+
+    def is_stale(self, folder_path):
+        for relative, stamp in self.meta["sources"].items():
+            path = os.path.join(folder_path, relative)
+            if not os.path.exists(path) or source_stamp(path) != stamp:
+                return True
+        return False
+
+
+def load_bundle(folder_path, settings):
+    # Devuelve el paquete de la carpeta si existe, está al día y coincide con los ajustes
+    path = bundle_path(folder_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        bundle = SceneBundle(path)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        log_message(f"Paquete de escena no válido [{folder_path}]: {e}", logging.WARNING)
+        return None
+    if bundle.settings != settings:
+        log_message(f"Paquete de escena generado con otros ajustes [{folder_path}]", logging.WARNING)
+        return None
+    if bundle.is_stale(folder_path):
+        log_message(f"Paquete de escena obsoleto [{folder_path}], vuelve a ejecutar bundle.py", logging.WARNING)
+        return None
+    return bundle
+
+
+def to_bundle_pixels(frame):
+    pixels = np.frombuffer(frame.data, dtype=np.uint8).reshape(-1, 4)
+    return pixels[:, [2, 1, 0, 3]].tobytes()
+
+
+def sprite_frames(src, size_min, size_max):
+    from PIL import Image
+
+    image = Image.open(src).convert("RGBA")
+    frames = []
+    for size in range(size_min, size_max + 1):
+        resized = image.resize((max(1, size), max(1, size)), Image.ANTIALIAS)
+        frames.append(RenderedFrame(resized.tobytes(), resized.size, (0, 0)))
+    return frames
+
+
+def build_bundle(folder_path, settings):
+    screen_size = tuple(settings["screen_size"])
+    max_file_size, max_resolution = settings["max_file_size"], settings["max_resolution"]
+    background_path = os.path.join(folder_path, "background.png")
+    center_path = os.path.join(folder_path, "center.png")
+    config_path = os.path.join(folder_path, "particles_config.json")
+
+    with open(config_path, "r") as config_file:
+        config = validate_particle_config(json.load(config_file), folder_path)
+    sources = [background_path, center_path, config_path]
+
+    background = performance_test(background_path, max_file_size, max_resolution)
+    angles, index = frame_angles(settings["fps_background"], rotational_symmetry(background))
+    keyframes = keyframe_indices(config["rotation"], len(angles))
+    frames = {"background": [render_rotated_frame(background, angles[frame], screen_size) for frame in keyframes]}
+    if len(keyframes) < len(angles):
+        frames["background_base"] = [render_base_frame(background, angles, screen_size)]
+
+    center = performance_test(center_path, max_file_size, max_resolution)
+    frames["center"] = center_ladder(center, settings["center_scale"], settings["max_scale"], settings["center_scale_step"])
+
+    for group, properties in enumerate(config["particle_properties"]):
+        if properties.get("src"):
+            frames[f"sprites/{group}"] = sprite_frames(properties["src"], properties["size_min"], properties["size_max"])
+            sources.append(properties["src"])
+            # Dentro del paquete el sprite ya no depende de la ruta original
+            properties["src"] = os.path.relpath(properties["src"], folder_path)
+
+    meta = {
+        "settings": settings,
+        "config": config,
+        "rotation_index": index,
+        "rotation_angles": angles,
+        "keyframes": keyframes,
+        "center_size": list(center.size),
+        "format": PIXEL_FORMAT,
+        "sources": {os.path.relpath(path, folder_path): source_stamp(path) for path in sources},
+        "frames": {},
+    }
+    # Los desplazamientos dependen de la longitud del índice, que a su vez los contiene:
+    # se reserva espacio de sobra y se rellena con espacios
+    entries = {name: [[0, frame.size[0], frame.size[1], frame.offset[0], frame.offset[1]] for frame in items]
+               for name, items in frames.items()}
+    meta["frames"] = entries
+    reserved = len(json.dumps(meta)) + 32 * sum(len(items) for items in frames.values()) + 64
+    offset = HEADER.size + reserved
+    for name, items in frames.items():
+        for entry, frame in zip(entries[name], items):
+            entry[0] = offset
+            offset += len(frame.data)
+    encoded = json.dumps(meta).encode()
+    if len(encoded) > reserved:
+        raise ValueError("índice del paquete mayor de lo previsto")
+
+    path = bundle_path(folder_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, BUNDLE_VERSION, reserved))
+        f.write(encoded.ljust(reserved))
+        for name, items in frames.items():
+            for frame in items:
+                f.write(to_bundle_pixels(frame))
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila cada carpeta de imágenes en un paquete de escena")
+    parser.add_argument("directories", nargs="*", default=["images"], help="Directorios con carpetas de escenas")
+    parser.add_argument("--folders", nargs="+", help="Carpetas concretas en lugar de directorios completos")
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600])
+    parser.add_argument("--center-scale-step", type=float, default=DEFAULT_CENTER_SCALE_STEP)
+    args = parser.parse_args()
+
+    folders = args.folders or sorted(os.path.join(directory, name) for directory in args.directories
+                                     for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+    settings = scene_settings(args.size, args.center_scale_step)
+    failed = 0
+    for folder in folders:
+        start = time.perf_counter()
+        try:
+            path = build_bundle(folder, settings)
+        except (OSError, ValueError) as e:
+            log_message(f"No se pudo compilar [{folder}]: {e}", logging.ERROR)
+            failed += 1
+            continue
+        log_message(f"Paquete compilado [{folder}]: {os.path.getsize(path) / 1024 / 1024:.1f} MB en {time.perf_counter() - start:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,189 @@
+import time
+import weakref
+
+import pygame
+
+# Composición del fotograma por capas: fondo, imagen central, partículas y
+# superposiciones (transición, HUD). Es la única composición: la usan el bucle
+# en directo, el fotograma entrante del fundido y el render sin conexión. Mientras el fotograma de fondo no cambia
+# (rotación en pausa) no se repinta la pantalla entera: solo se restaura el
+# fondo bajo lo que se dibujó en el fotograma anterior y se envían a la
+# ventana esos rectángulos con display.update().
+#
+# Con una escala de render menor que 1, el fondo y la imagen central se
+# componen en un lienzo reducido que se amplía a la pantalla; las partículas y
+# las superposiciones se siguen dibujando a resolución completa. Las versiones
+# reducidas son de la carpeta en pantalla: se descartan al cambiar de carpeta
+# y solo guardan una referencia débil a la superficie original, así que no
+# retienen fotogramas de carpetas ya liberadas.
+#
+# Los efectos de píxel, si los hay, se aplican sobre el fotograma ya compuesto
+# y antes de las superposiciones; como cambian toda la pantalla, con ellos
+# cada fotograma se repinta entero.
+#
+# Con una salida en memoria compartida (framesink.FrameSink), cada fotograma
+# presentado se publica también allí, tal como se ve en la ventana.
+
+BACKGROUND_COLOR = (0, 0, 0)
+SCALED_CACHE_SIZE = 256  # Superficies reducidas que se conservan para el lienzo (fotogramas bajo demanda)
+
+
+class Compositor:
+    def __init__(self, screen, stats=None):
+        self.screen = screen
+        self.stats = stats
+        self.background = None  # Fotograma de fondo en pantalla; None obliga a repintar todo
+        self.dirty = []  # Rectángulos dibujados encima del fondo en el fotograma anterior
+        self.full = True
+        self.updated_area = 1.0  # Fracción de la pantalla enviada en el último fotograma
+        self.render_scale = 1.0
+        self.canvas = None
+        self.scaled = {}  # id(superficie) -> (referencia débil a la superficie, versión reducida)
+        self.scaled_folder = None  # Referencia débil a la carpeta de esas superficies
+        self.effects = None  # EffectsPipeline, o None sin efectos
+        self.effects_enabled = True  # El nivel de calidad puede desactivarlos
+        self.frame_sink = None  # FrameSink para otros procesos, o None
+
+    def set_render_scale(self, scale):
+        self.render_scale = scale
+        self.scaled = {}
+        self.scaled_folder = None
+        self.canvas = None
+        if scale < 1:
+            width, height = self.screen.get_size()
+            self.canvas = pygame.Surface((max(1, int(width * scale)), max(1, int(height * scale))))
+            if pygame.display.get_surface() is not None:
+                self.canvas = self.canvas.convert()
+        self.invalidate()
+
+    def scaled_surface(self, surface):
+        # Cada superficie se reduce una sola vez; la referencia débil a la original
+        # evita que un id reutilizado devuelva otra imagen sin mantenerla viva
+        entry = self.scaled.get(id(surface))
+        if entry is None or entry[0]() is not surface:
+            if len(self.scaled) >= SCALED_CACHE_SIZE:
+                self.scaled.clear()
+            width, height = surface.get_size()
+            size = (max(1, round(width * self.render_scale)), max(1, round(height * self.render_scale)))
+            entry = self.scaled[id(surface)] = (weakref.ref(surface), pygame.transform.smoothscale(surface, size))
+        return entry[1]
+
+    def use_folder(self, folder):
+        # Las versiones reducidas de otra carpeta ya no se van a dibujar
+        if self.scaled_folder is None or self.scaled_folder() is not folder:
+            self.scaled = {}
+            self.scaled_folder = weakref.ref(folder)
+
+    def invalidate(self):
+        # Tras cambiar de modo de pantalla o pintar fuera del compositor
+        self.background = None
+
+    def compose(self, folder, overlays=(), full=False):
+        # Fotograma del bucle en directo: avanza la animación de la carpeta, dibuja
+        # todas las capas y las envía a la ventana
+        self.present(self.draw_folder(folder, overlays, full))
+
+    def draw_folder(self, folder, overlays=(), full=False):
+        # Obtener los fotogramas también cuenta: en los modos bajo demanda un fallo de
+        # la caché de rotación cuesta más que dibujar
+        self.use_folder(folder)
+        start = time.perf_counter()
+        background = folder.get_background_image()
+        background_done = time.perf_counter()
+        center_img = folder.get_center_image()
+        if self.stats is not None:
+            self.stats.record("background_fetch", background_done - start)
+            self.stats.record("center_fetch", time.perf_counter() - background_done)
+        return self.draw(background, center_img, folder.draw_particles, overlays, full)
+
+    def draw(self, background, center_img, draw_particles, overlays=(), full=False, effect_params=None):
+        # Dibuja todas las capas sin presentarlas y devuelve los rectángulos tocados.
+        # 'draw_particles' y 'overlays' son funciones que pintan sobre la pantalla y
+        # devuelven el rectángulo (o la lista) que han tocado; 'effect_params' fija los
+        # parámetros de los efectos (por defecto, los del último update del pipeline)
+        start = time.perf_counter()
+        effects = self.effects is not None and self.effects_enabled
+        self.full = full or effects or self.canvas is not None or background is not self.background
+        if self.canvas is not None:
+            self.draw_scaled(background, center_img)
+            background_done = center_done = time.perf_counter()
+            rects = []
+        else:
+            self.draw_background(background)
+            background_done = time.perf_counter()
+            rects = [self.draw_center(center_img)]
+            center_done = time.perf_counter()
+
+        rects.extend(draw_particles(self.screen) or [])
+        particles_done = time.perf_counter()
+        if effects:
+            self.effects.apply(self.screen, effect_params)
+        effects_done = time.perf_counter()
+
+        for overlay in overlays:
+            drawn = overlay(self.screen)
+            if isinstance(drawn, pygame.Rect):
+                rects.append(drawn)
+            elif drawn:
+                rects.extend(drawn)
+
+        # Una superposición a pantalla completa deja restos que solo borra un repintado completo
+        self.background = None if full else background
+        if self.stats is not None:
+            self.stats.record("background", background_done - start)
+            self.stats.record("center", center_done - background_done)
+            self.stats.record("particle_draw", particles_done - center_done)
+            if effects:
+                self.stats.record("effects", effects_done - particles_done)
+        return rects
+
+    def apply_quality(self, level):
+        self.set_render_scale(level.render_scale)
+        self.effects_enabled = level.effects
+
+    def draw_background(self, background):
+        surface, offset = background
+        if self.full:
+            self.screen.fill(BACKGROUND_COLOR)
+            self.screen.blit(surface, offset)
+            return
+        # Restaura el fondo solo donde se dibujó algo encima
+        area = surface.get_rect(topleft=offset)
+        for rect in self.dirty:
+            self.screen.fill(BACKGROUND_COLOR, rect)
+            visible = rect.clip(area)
+            if visible:
+                self.screen.blit(surface, visible.topleft, visible.move(-offset[0], -offset[1]))
+
+    def draw_center(self, center_img):
+        return self.screen.blit(center_img, center_img.get_rect(center=self.screen.get_rect().center))
+
+    def draw_scaled(self, background, center_img):
+        surface, offset = background
+        self.canvas.fill(BACKGROUND_COLOR)
+        self.canvas.blit(self.scaled_surface(surface), (round(offset[0] * self.render_scale), round(offset[1] * self.render_scale)))
+        center_img = self.scaled_surface(center_img)
+        self.canvas.blit(center_img, center_img.get_rect(center=self.canvas.get_rect().center))
+        pygame.transform.scale(self.canvas, self.screen.get_size(), self.screen)
+
+    def present(self, rects):
+        flip_start = time.perf_counter()
+        screen_rect = self.screen.get_rect()
+        rects = [rect.clip(screen_rect) for rect in rects]
+        rects = [rect for rect in rects if rect]
+        if self.full:
+            pygame.display.flip()
+            self.updated_area = 1.0
+        else:
+            # Lo dibujado ahora más lo que se borró del fotograma anterior
+            update = self.dirty + rects
+            pygame.display.update(update)
+            self.updated_area = min(1.0, sum(rect.w * rect.h for rect in update) / (screen_rect.w * screen_rect.h))
+        self.dirty = rects
+        flip_done = time.perf_counter()
+        if self.frame_sink is not None:
+            self.frame_sink.publish(self.screen)
+        if self.stats is not None:
+            self.stats.record("flip", flip_done - flip_start)
+            if self.frame_sink is not None:
+                self.stats.record("frame_sink", time.perf_counter() - flip_done)
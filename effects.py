@@ -0,0 +1,143 @@
+import collections
+
+import numpy as np
+import pygame
+
+# Efectos de píxel sobre el fotograma compuesto, reactivos al audio: tinte
+# (graves), pulso de brillo (golpes), desplazamiento cromático (agudos y
+# golpes) y viñeta (más oscura cuanto más bajo suena). Trabajan en el sitio
+# sobre la vista de pygame.surfarray.pixels3d, canal a canal, con búferes
+# NumPy reservados al crear el pipeline: un fotograma no reserva memoria para
+# píxeles.
+#
+# Cada canal se copia (ya desplazado, para el efecto cromático) a un búfer
+# uint16 donde el tinte y el brillo son una ganancia y una suma en coma fija,
+# y la viñeta una máscara también en coma fija (256 = sin oscurecer).
+#
+# Son opcionales (--effects): con ellos el compositor repinta la pantalla entera
+# en cada fotograma y pierde los rectángulos sucios.
+
+EFFECTS = ("tint", "brightness", "chromatic", "vignette")
+
+# Parámetros de un fotograma, calculados a partir del audio
+EffectParams = collections.namedtuple("EffectParams", ["tint", "brightness", "offset", "vignette"])
+
+NO_EFFECT = EffectParams(0.0, 0.0, 0, 0.0)
+
+# Resolución de la fuerza de la viñeta; cada nivel usado guarda su máscara
+VIGNETTE_STEP = 0.05
+
+
+def selected_effects(names):
+    # Valor de la opción --effects: sin la opción ninguno, sin valores todos
+    if names is None:
+        return ()
+    return tuple(names) or EFFECTS
+
+
+class EffectsPipeline:
+    def __init__(self, size, enabled=EFFECTS, tint_color=(255, 60, 170), max_tint=0.35, max_brightness=0.3,
+                 max_offset=6, vignette_strength=0.7, vignette_radius=0.45, smoothing=0.3, pulse_decay=0.8):
+        for name in enabled:
+            if name not in EFFECTS:
+                raise ValueError(f"Efecto desconocido: {name}")
+        self.size = size
+        self.enabled = set(enabled)
+        self.tint_color = np.asarray(tint_color, dtype=np.float32)
+        self.max_tint = max_tint
+        self.max_brightness = max_brightness
+        self.max_offset = max_offset
+        self.vignette_strength = vignette_strength
+        self.smoothing = smoothing  # Peso del valor nuevo en la media exponencial
+        self.pulse_decay = pulse_decay  # Factor por fotograma con el que se apaga el pulso de un golpe
+        self.bass = 0.0
+        self.treble = 0.0
+        self.volume = 0.0
+        self.pulse = 0.0
+        self.params = NO_EFFECT
+
+        width, height = size
+        # Búferes reservados una sola vez, con la forma (ancho, alto) de surfarray
+        self.wide = np.empty((width, height), dtype=np.uint16)
+        self.mask_scratch = np.empty((width, height), dtype=np.float32)
+        self.masks = {}  # Nivel de fuerza -> máscara de viñeta
+
+        # Caída de la viñeta: 0 dentro de la elipse de radio 'vignette_radius', 1 en las esquinas
+        x = (np.arange(width, dtype=np.float32) - width / 2) / (width / 2)
+        y = (np.arange(height, dtype=np.float32) - height / 2) / (height / 2)
+        distance = np.sqrt(x[:, None] ** 2 + y[None, :] ** 2) / np.sqrt(2)
+        self.falloff = (np.clip((distance - vignette_radius) / (1 - vignette_radius), 0, 1) ** 2).astype(np.float32)
+
+    def update(self, features):
+        # Convierte los valores de audio del fotograma en parámetros de efecto
+        self.bass += (min(1.0, features.bass * 4) - self.bass) * self.smoothing
+        self.treble += (min(1.0, features.treble * 20) - self.treble) * self.smoothing
+        self.volume += (min(1.0, features.volume) - self.volume) * self.smoothing
+        self.pulse = 1.0 if features.beat else self.pulse * self.pulse_decay
+        self.params = EffectParams(
+            tint=self.max_tint * self.bass if "tint" in self.enabled else 0.0,
+            brightness=self.max_brightness * self.pulse if "brightness" in self.enabled else 0.0,
+            offset=int(round(self.max_offset * max(self.treble, self.pulse))) if "chromatic" in self.enabled else 0,
+            vignette=self.vignette_strength * (1 - 0.5 * self.volume) if "vignette" in self.enabled else 0.0,
+        )
+        return self.params
+
+    def channel_transform(self, params):
+        # Tinte, p * (1 - t) + color * t, y después brillo como mezcla "trama" hacia el
+        # blanco, p * (1 - b) + 255 * b: el resultado nunca pasa de 255 y no hay que
+        # recortarlo. Ganancia y suma en coma fija de 7 bits
+        gain = (1 - params.tint) * (1 - params.brightness)
+        add = self.tint_color * params.tint * (1 - params.brightness) + 255 * params.brightness
+        return int(gain * 128), [int(value * 128) for value in add]
+
+    def vignette_mask(self, strength):
+        # Una máscara por nivel de fuerza (pasos de VIGNETTE_STEP), calculada la primera vez que se usa
+        level = int(round(strength / VIGNETTE_STEP))
+        mask = self.masks.get(level)
+        if mask is None:
+            np.multiply(self.falloff, -256 * level * VIGNETTE_STEP, out=self.mask_scratch)
+            self.mask_scratch += 256
+            mask = self.masks[level] = self.mask_scratch.astype(np.uint16)
+        return mask
+
+    def apply(self, surface, params=None):
+        params = self.params if params is None else params
+        transform = params.tint > 0.001 or params.brightness > 0.001
+        vignette = params.vignette > 0.005
+        offset = min(params.offset, self.size[0] - 1)
+        if not (transform or vignette or offset):
+            return
+        if transform:
+            gain, adds = self.channel_transform(params)
+        if vignette:
+            mask = self.vignette_mask(params.vignette)
+
+        wide = self.wide
+        pixels = pygame.surfarray.pixels3d(surface)
+        try:
+            for c in range(3):
+                source = pixels[:, :, c]
+                # Rojo hacia la derecha y azul hacia la izquierda; el verde no se mueve
+                shift = offset if c == 0 else -offset if c == 2 else 0
+                if not (transform or vignette or shift):
+                    continue
+                if shift > 0:
+                    wide[shift:] = source[:-shift]
+                    wide[:shift] = source[:shift]
+                elif shift < 0:
+                    wide[:shift] = source[-shift:]
+                    wide[shift:] = source[shift:]
+                else:
+                    wide[...] = source
+
+                if transform:
+                    wide *= gain
+                    wide += adds[c]
+                    wide >>= 7
+                if vignette:
+                    wide *= mask
+                    wide >>= 8
+                source[...] = wide
+        finally:
+            # La superficie queda bloqueada mientras exista la vista
+            del pixels
@@ -0,0 +1,120 @@
+import hashlib
+import mmap
+import os
+import struct
+
+from frames import RenderedFrame
+
+# Caché en disco de los fotogramas rotados del fondo. Cada entrada es un único
+# fichero RGBA crudo que se mapea en memoria, de modo que un arranque en caliente
+# no pasa por PIL.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "frames")
+CACHE_VERSION = 2
+
+# Cabecera: firma, versión, ancho y alto de pantalla, pasos de rotación y fotogramas únicos
+HEADER = struct.Struct("<4sIIIII")
+# Por fotograma único: desplazamiento de los píxeles en el fichero, tamaño y posición en pantalla
+ENTRY = struct.Struct("<Qiiii")
+INDEX = struct.Struct("<I")
+MAGIC = b"VISF"
+KEY_LENGTH = 20
+PATH_HASH_LENGTH = 12
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(image_path, screen_size, fps_background, *extra):
+    # La clave depende del contenido de la imagen y de los ajustes que afectan al render
+    digest = hashlib.sha1()
+    digest.update(hash_file(image_path).encode())
+    digest.update(repr((CACHE_VERSION, tuple(screen_size), fps_background) + extra).encode())
+    return digest.hexdigest()[:KEY_LENGTH]
+
+
+class FrameCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def entry_prefix(self, folder_path):
+        # Prefijo por carpeta para poder limpiar entradas obsoletas: el nombre legible y
+        # el hash de la ruta absoluta, que distingue "Rick&Morty" de "Rick_Morty"
+        folder_path = os.path.abspath(folder_path)
+        name = "".join(c if c.isalnum() else "_" for c in os.path.basename(folder_path))
+        return f"{name}-{hashlib.sha1(folder_path.encode()).hexdigest()[:PATH_HASH_LENGTH]}-"
+
+    def entry_path(self, folder_path, key):
+        return os.path.join(self.cache_dir, f"{self.entry_prefix(folder_path)}{key}.rgba")
+
+    def load(self, folder_path, key, size):
+        # Devuelve (fotogramas únicos, índice por paso de rotación) o None si no hay entrada válida
+        path = self.entry_path(folder_path, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, version, width, height, steps, unique = HEADER.unpack_from(mapped, 0)
+            if magic != MAGIC or version != CACHE_VERSION or (width, height) != tuple(size):
+                raise ValueError(path)
+
+            # Los fotogramas comparten memoria con el mapeo (copia en escritura); el sistema
+            # carga las páginas bajo demanda
+            view = memoryview(mapped)
+            position = HEADER.size
+            frames = []
+            for _ in range(unique):
+                offset, frame_width, frame_height, x, y = ENTRY.unpack_from(mapped, position)
+                position += ENTRY.size
+                end = offset + frame_width * frame_height * 4
+                if end > len(mapped):
+                    raise ValueError(path)
+                frames.append(RenderedFrame(view[offset:end], (frame_width, frame_height), (x, y)))
+            index = [INDEX.unpack_from(mapped, position + i * INDEX.size)[0] for i in range(steps)]
+            if any(i >= unique for i in index):
+                raise ValueError(path)
+        except (struct.error, ValueError):
+            return None
+        return frames, index
+
+    def store(self, folder_path, key, size, frames, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.entry_path(folder_path, key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        width, height = size
+        offset = HEADER.size + ENTRY.size * len(frames) + INDEX.size * len(index)
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, CACHE_VERSION, width, height, len(index), len(frames)))
+            for frame in frames:
+                f.write(ENTRY.pack(offset, frame.size[0], frame.size[1], frame.offset[0], frame.offset[1]))
+                offset += len(frame.data)
+            for i in index:
+                f.write(INDEX.pack(i))
+            for frame in frames:
+                f.write(frame.data)
+        os.replace(tmp_path, path)
+        self.purge(folder_path, keep=path)
+        return path
+
+    def purge(self, folder_path, keep=None):
+        # Elimina las entradas antiguas de la carpeta (imagen o ajustes distintos)
+        prefix = self.entry_prefix(folder_path)
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            key = name[len(prefix):-len(".rgba")]
+            if (name.startswith(prefix) and name.endswith(".rgba") and len(key) == KEY_LENGTH
+                    and path != keep):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
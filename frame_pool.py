@@ -0,0 +1,76 @@
+import collections
+import os
+from multiprocessing import shared_memory
+
+from frames import RenderedFrame, performance_test, render_rotated_frame
+
+# Generación de los fotogramas rotados repartida entre procesos. Cada proceso
+# escribe los píxeles en su zona de un bloque de memoria compartida y solo
+# devuelve el tamaño y la posición de cada fotograma, sin serializar píxeles.
+#
+# Los fotogramas se piden por tandas de BATCH_SIZE: el bloque tiene una zona
+# de BATCH_SIZE huecos por proceso y cada zona se reutiliza en cuanto se han
+# copiado sus fotogramas, así que ocupa lo mismo con 30 ángulos que con 360.
+
+BATCH_SIZE = 4
+
+# Imagen ya decodificada en este proceso, para no leerla en cada tanda
+worker_image = (None, None)
+
+
+def load_image(image_path, max_file_size, max_resolution):
+    global worker_image
+    key = (image_path, os.path.getmtime(image_path), max_file_size, max_resolution)
+    if worker_image[0] != key:
+        worker_image = (key, performance_test(image_path, max_file_size, max_resolution))
+    return worker_image[1]
+
+
+def render_chunk(shm_name, image_path, max_file_size, max_resolution, screen_size, angles, first_slot):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = load_image(image_path, max_file_size, max_resolution)
+        slot_size = screen_size[0] * screen_size[1] * 4
+        results = []
+        for slot, angle in enumerate(angles, first_slot):
+            frame = render_rotated_frame(image, angle, screen_size)
+            start = slot * slot_size
+            shm.buf[start:start + len(frame.data)] = frame.data
+            results.append((frame.size, frame.offset))
+        return results
+    finally:
+        shm.close()
+
+
+def render_frames_parallel(executor, workers, image_path, max_file_size, max_resolution, screen_size, angles):
+    # Cada hueco tiene el tamaño de la pantalla, el máximo posible de un fotograma recortado
+    slot_size = screen_size[0] * screen_size[1] * 4
+    batches = [list(range(start, min(start + BATCH_SIZE, len(angles)))) for start in range(0, len(angles), BATCH_SIZE)]
+    regions = max(1, min(workers, len(batches)))
+    shm = shared_memory.SharedMemory(create=True, size=max(1, slot_size * BATCH_SIZE * regions))
+    try:
+        frames = [None] * len(angles)
+        pending = collections.deque()
+        remaining = collections.deque(batches)
+
+        def submit(region):
+            batch = remaining.popleft()
+            future = executor.submit(render_chunk, shm.name, image_path, max_file_size, max_resolution, screen_size,
+                                     [angles[i] for i in batch], region * BATCH_SIZE)
+            pending.append((region, batch, future))
+
+        for region in range(regions):
+            if remaining:
+                submit(region)
+        while pending:
+            region, batch, future = pending.popleft()
+            for slot, (number, (size, offset)) in enumerate(zip(batch, future.result()), region * BATCH_SIZE):
+                start = slot * slot_size
+                frames[number] = RenderedFrame(bytes(shm.buf[start:start + size[0] * size[1] * 4]), size, offset)
+            # La zona ya está copiada: recibe la siguiente tanda
+            if remaining:
+                submit(region)
+        return frames
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,120 @@
+import collections
+import math
+import os
+
+import numpy as np
+
+# Generación de los fotogramas rotados del fondo. Cada fotograma se recorta a su
+# contenido visible y se guarda junto con su posición en pantalla, en lugar de
+# pegarlo en un lienzo transparente del tamaño de la pantalla. PIL se importa
+# al usarlo: con paquetes de escena o caché el arranque no lo necesita.
+
+# 'format' es el orden de los canales tal como lo acepta pygame.image.frombuffer
+RenderedFrame = collections.namedtuple("RenderedFrame", ["data", "size", "offset", "format"], defaults=["RGBA"])
+
+# Diferencia media (0-255) por debajo de la cual dos rotaciones se consideran iguales
+SYMMETRY_TOLERANCE = 1.5
+SYMMETRY_SAMPLE_SIZE = 128
+
+
+def performance_test(image_path, max_file_size, max_resolution):
+    from PIL import Image
+
+    image = Image.open(image_path)
+    file_size = os.path.getsize(image_path)
+    resolution = image.size[0] * image.size[1]
+
+    if file_size > max_file_size or resolution > max_resolution:
+        factor = max(file_size / max_file_size, resolution / max_resolution)
+        new_size = (int(image.size[0] / factor**0.5), int(image.size[1] / factor**0.5))
+        image = image.resize(new_size, Image.ANTIALIAS)
+
+    return image
+
+
+def scale_to_fit(image, screen_size):
+    # Escala la imagen para que quepa en pantalla y devuelve la posición centrada
+    from PIL import Image
+
+    screen_width, screen_height = screen_size
+    image_ratio = image.width / image.height
+    screen_ratio = screen_width / screen_height
+    if image_ratio > screen_ratio:
+        new_width = screen_width
+        new_height = int(new_width / image_ratio)
+    else:
+        new_height = screen_height
+        new_width = int(new_height * image_ratio)
+    resized_image = image.resize((new_width, new_height), Image.ANTIALIAS)
+    offset = (int((screen_width - new_width) / 2), int((screen_height - new_height) / 2))
+    return resized_image, offset
+
+
+def render_rotated_frame(image, angle, screen_size):
+    rotated_image = image.rotate(angle, expand=True)
+    scaled_image, (x, y) = scale_to_fit(rotated_image.convert("RGBA"), screen_size)
+
+    # Recorta las zonas totalmente transparentes (esquinas de la rotación, bordes vacíos)
+    bbox = scaled_image.getchannel("A").getbbox()
+    if bbox is None:
+        bbox = (0, 0, 1, 1)
+    trimmed = scaled_image.crop(bbox)
+    return RenderedFrame(trimmed.tobytes(), trimmed.size, (x + bbox[0], y + bbox[1]))
+
+
+def center_ladder(image, center_scale, max_scale, step):
+    # Escalera de tamaños de la imagen central entre 1.0x y max_scale
+    from PIL import Image
+
+    image = image.convert("RGBA")
+    levels = int(round((max_scale - 1) / step)) + 1
+    frames = []
+    for level in range(levels):
+        scale = min(max_scale, 1 + level * step)
+        size = (max(1, int(image.width * center_scale * scale)),
+                max(1, int(image.height * center_scale * scale)))
+        frames.append(RenderedFrame(image.resize(size, Image.ANTIALIAS).tobytes(), size, (0, 0)))
+    return frames
+
+
+def rotational_symmetry(image, tolerance=SYMMETRY_TOLERANCE):
+    # Devuelve el periodo de simetría rotacional en grados (90, 180 o 360 si no hay)
+    from PIL import Image
+
+    sample = np.asarray(image.convert("RGBA").resize((SYMMETRY_SAMPLE_SIZE, SYMMETRY_SAMPLE_SIZE), Image.BILINEAR), dtype=np.int16)
+    square = image.width == image.height
+    for period, turns in ((90, 1), (180, 2)):
+        if period == 90 and not square:
+            continue
+        rotated = np.rot90(sample, k=turns, axes=(0, 1))
+        if np.abs(rotated - sample).mean() < tolerance:
+            return period
+    return 360
+
+
+def frame_angles(fps_background, period=360):
+    # Ángulos únicos a generar y, para cada paso de 0 a 360, el índice del fotograma que lo representa
+    if period % fps_background:
+        period = 360
+    angles = list(range(0, period, fps_background))
+    index = [(angle % period) // fps_background for angle in range(0, 360, fps_background)]
+    return angles, index
+
+
+def fit_scale(size, angle, screen_size):
+    # Escala con la que una imagen de tamaño 'size', rotada 'angle' grados, cabe en pantalla
+    width, height = size
+    radians = math.radians(angle)
+    cos, sin = abs(math.cos(radians)), abs(math.sin(radians))
+    return min(screen_size[0] / (width * cos + height * sin), screen_size[1] / (width * sin + height * cos))
+
+
+def render_base_frame(image, angles, screen_size):
+    # Imagen sin rotar escalada al mayor tamaño que alcanza en pantalla entre todos los
+    # ángulos: rotarla para cualquiera de ellos solo necesita reducirla
+    from PIL import Image
+
+    scale = max(fit_scale(image.size, angle, screen_size) for angle in angles)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    resized = image.convert("RGBA").resize(size, Image.ANTIALIAS)
+    return RenderedFrame(resized.tobytes(), size, (0, 0))
@@ -0,0 +1,253 @@
+import argparse
+import collections
+import os
+import time
+
+import numpy as np
+import pygame
+from multiprocessing import resource_tracker, shared_memory
+
+# Salida de fotogramas a memoria compartida para otros procesos de la misma
+# máquina (muros LED, un segundo proyector). El visualizador copia cada
+# fotograma compuesto a un anillo de ranuras en un bloque
+# multiprocessing.shared_memory; los lectores ven las ranuras como arrays
+# NumPy sin copiarlas. El visualizador nunca espera a un lector: si un lector
+# va lento, pierde fotogramas.
+#
+# Disposición del bloque (todo alineado a 8 bytes):
+#
+#   cabecera   HEADER_FIELDS enteros int64 (formato, tamaño, último número,
+#              resource_tracker del visualizador)
+#   números    un int64 por ranura: número del fotograma que contiene, 0 mientras se escribe
+#   ranuras    'slots' fotogramas de alto x ancho píxeles de 32 bits, fila a fila
+#
+# Los números empiezan en 1. Un lector comprueba el número de la ranura antes
+# y después de usarla: si ha cambiado, el visualizador la estaba
+# sobrescribiendo y el fotograma no es fiable.
+#
+#   python framesink.py vis_frames   # lector de ejemplo: muestra los FPS recibidos
+
+MAGIC = 0x56495346  # "VISF"
+VERSION = 2
+HEADER_FIELDS = ("magic", "version", "width", "height", "slots", "latest", "red_mask", "green_mask", "blue_mask",
+                 "closed", "tracker")
+DEFAULT_NAME = "vis_frames"
+DEFAULT_SLOTS = 3
+
+# Fotograma de un lector: 'pixels' es una vista (alto, ancho) de uint32 sobre la memoria compartida
+Frame = collections.namedtuple("Frame", ["sequence", "slot", "pixels"])
+
+
+def block_size(width, height, slots):
+    return 8 * (len(HEADER_FIELDS) + slots) + slots * width * height * 4
+
+
+def map_block(buffer, width, height, slots):
+    # Vistas de la cabecera, los números y las ranuras sobre el mismo bloque
+    header_end = 8 * len(HEADER_FIELDS)
+    header = np.ndarray((len(HEADER_FIELDS),), dtype=np.int64, buffer=buffer)
+    sequences = np.ndarray((slots,), dtype=np.int64, buffer=buffer, offset=header_end)
+    frames = np.ndarray((slots, height, width), dtype=np.uint32, buffer=buffer, offset=header_end + 8 * slots)
+    return header, sequences, frames
+
+
+def field(name):
+    return HEADER_FIELDS.index(name)
+
+
+def tracker_id():
+    # Identidad del resource_tracker que usa este proceso: el inodo de su tubería, que
+    # heredan los procesos hijos (spawn y fork) y que comparten con él el registro
+    return os.fstat(resource_tracker.getfd()).st_ino
+
+
+class FrameSink:
+    # Lado del visualizador: crea el bloque y publica fotogramas; solo lo usa el hilo principal
+
+    def __init__(self, size, name=DEFAULT_NAME, slots=DEFAULT_SLOTS):
+        if slots < 2:
+            raise ValueError("El anillo necesita al menos dos ranuras")
+        width, height = size
+        self.size = size
+        self.slots = slots
+        self.sequence = 0
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=block_size(width, height, slots))
+        self.header, self.sequences, self.frames = map_block(self.memory.buf, width, height, slots)
+        self.sequences[:] = 0
+        # Superficie intermedia solo si la pantalla no tiene píxeles de 32 bits
+        self.scratch = None
+        self.masks = (0xFF0000, 0xFF00, 0xFF)
+        self.header[:] = 0
+        self.header[field("width")] = width
+        self.header[field("height")] = height
+        self.header[field("slots")] = slots
+        self.header[field("red_mask")], self.header[field("green_mask")], self.header[field("blue_mask")] = self.masks
+        self.header[field("tracker")] = tracker_id()
+        self.header[field("version")] = VERSION
+        # La firma va la última: un lector no acepta el bloque hasta que está completo
+        self.header[field("magic")] = MAGIC
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def publish(self, surface):
+        if surface.get_size() != self.size:
+            raise ValueError(f"Tamaño de fotograma {surface.get_size()} distinto del de la salida {self.size}")
+        if surface.get_bitsize() != 32:
+            if self.scratch is None:
+                self.scratch = pygame.Surface(self.size, 0, 32)
+            self.scratch.blit(surface, (0, 0))
+            surface = self.scratch
+        masks = surface.get_masks()[:3]
+        if masks != self.masks:
+            # Cambio de formato (por ejemplo, al pasar a pantalla completa): se anuncia antes de escribir
+            self.masks = masks
+            self.header[field("red_mask")], self.header[field("green_mask")], self.header[field("blue_mask")] = masks
+
+        self.sequence += 1
+        slot = self.sequence % self.slots
+        self.sequences[slot] = 0
+        pixels = pygame.surfarray.pixels2d(surface)
+        try:
+            # surfarray es (ancho, alto); la ranura va fila a fila
+            self.frames[slot] = pixels.T
+        finally:
+            del pixels
+        self.sequences[slot] = self.sequence
+        self.header[field("latest")] = self.sequence
+        return self.sequence
+
+    def close(self):
+        # Avisa a los lectores y borra el bloque; los que aún lo tengan abierto siguen viendo el último contenido
+        self.header[field("closed")] = 1
+        del self.header, self.sequences, self.frames
+        self.memory.close()
+        self.memory.unlink()
+
+
+class FrameReader:
+    # Lado del consumidor: abre el bloque de un FrameSink ya creado
+
+    def __init__(self, name=DEFAULT_NAME):
+        # Abrir un bloque lo registra para borrarlo al salir, pero el dueño es el visualizador
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+            tracked = False
+        except TypeError:
+            self.memory = shared_memory.SharedMemory(name=name)
+            tracked = True
+        header = np.ndarray((len(HEADER_FIELDS),), dtype=np.int64, buffer=self.memory.buf)
+        if header[field("magic")] != MAGIC or header[field("version")] != VERSION:
+            del header
+            if tracked:
+                resource_tracker.unregister(self.memory._name, "shared_memory")
+            self.memory.close()
+            raise ValueError(f"[{name}] no es una salida de fotogramas compatible")
+        # Con el resource_tracker del visualizador (el propio proceso o uno lanzado por él), el
+        # registro es el suyo: quitarlo haría que su unlink() fallara en el tracker
+        if tracked and header[field("tracker")] != tracker_id():
+            resource_tracker.unregister(self.memory._name, "shared_memory")
+        self.width = int(header[field("width")])
+        self.height = int(header[field("height")])
+        self.slots = int(header[field("slots")])
+        del header
+        self.header, self.sequences, self.frames = map_block(self.memory.buf, self.width, self.height, self.slots)
+        self.last_sequence = 0  # Último fotograma entregado
+
+    @property
+    def closed(self):
+        return bool(self.header[field("closed")])
+
+    def channel_shifts(self):
+        # Desplazamiento de cada canal (rojo, verde, azul) dentro del píxel de 32 bits
+        masks = (self.header[field("red_mask")], self.header[field("green_mask")], self.header[field("blue_mask")])
+        return tuple(int(mask).bit_length() - 8 for mask in masks)
+
+    def latest(self):
+        # Último fotograma publicado si es nuevo, sin copiarlo; None si no hay ninguno nuevo
+        sequence = int(self.header[field("latest")])
+        if sequence <= self.last_sequence:
+            return None
+        slot = sequence % self.slots
+        if self.sequences[slot] != sequence:
+            # Ya se está sobrescribiendo: el lector va más de una vuelta de anillo por detrás
+            return None
+        self.last_sequence = sequence
+        return Frame(sequence, slot, self.frames[slot])
+
+    def wait(self, timeout=None, poll=0.001):
+        # Espera un fotograma nuevo; None al agotar 'timeout' o si la salida se ha cerrado
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            frame = self.latest()
+            if frame is not None:
+                return frame
+            if self.closed or (deadline is not None and time.perf_counter() >= deadline):
+                return None
+            time.sleep(poll)
+
+    def is_valid(self, frame):
+        # Llamar después de usar 'frame.pixels': False si el visualizador la sobrescribió mientras tanto
+        return self.sequences[frame.slot] == frame.sequence
+
+    def read(self, timeout=None):
+        # Copia del siguiente fotograma completo, (número, array (alto, ancho, 3) RGB), para quien prefiera no validar
+        while True:
+            frame = self.wait(timeout)
+            if frame is None:
+                return None
+            red_shift, green_shift, blue_shift = self.channel_shifts()
+            rgb = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            rgb[..., 0] = frame.pixels >> red_shift
+            rgb[..., 1] = frame.pixels >> green_shift
+            rgb[..., 2] = frame.pixels >> blue_shift
+            if self.is_valid(frame):
+                return frame.sequence, rgb
+
+    def close(self):
+        # Antes hay que soltar las vistas de los fotogramas entregados
+        del self.header, self.sequences, self.frames
+        self.memory.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lector de ejemplo de la salida de fotogramas en memoria compartida")
+    parser.add_argument("name", nargs="?", default=DEFAULT_NAME, help="Nombre del bloque de memoria compartida")
+    args = parser.parse_args()
+
+    reader = FrameReader(args.name)
+    print(f"Leyendo [{args.name}]: {reader.width}x{reader.height}, {reader.slots} ranuras")
+    _, green_shift, _ = reader.channel_shifts()
+    received = lost = invalid = 0
+    frame = None
+    last_report = time.perf_counter()
+    try:
+        while True:
+            previous = reader.last_sequence
+            frame = reader.wait(timeout=5)
+            if frame is None:
+                break
+            if previous:
+                lost += frame.sequence - previous - 1
+            # Aquí un consumidor real enviaría frame.pixels a su dispositivo
+            brightness = float(((frame.pixels[::16, ::16] >> green_shift) & 0xFF).mean())
+            received += 1
+            if not reader.is_valid(frame):
+                invalid += 1
+            if time.perf_counter() - last_report >= 1:
+                elapsed = time.perf_counter() - last_report
+                last_report = time.perf_counter()
+                print(f"{received / elapsed:.1f} FPS recibidos, {lost} perdidos, {invalid} sobrescritos durante la "
+                      f"lectura (fotograma {frame.sequence}, verde medio {brightness:.0f})")
+                received = lost = invalid = 0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Las vistas de los fotogramas impiden cerrar el bloque
+        frame = None
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import collections
+import time
+
+import pygame
+
+# Contadores de tiempo por etapa, indicadores de memoria y una superposición
+# (HUD) en la ventana. Si la instrumentación está desactivada, el compositor
+# recibe None y no se mide nada.
+
+StageStats = collections.namedtuple("StageStats", ["mean", "max", "count"])
+
+
+class Instrumentation:
+    def __init__(self, window=120):
+        self.window = window  # Fotogramas que entran en la media y el máximo
+        self.stages = {}
+        self.gauges = {}
+
+    def record(self, stage, seconds):
+        values = self.stages.get(stage)
+        if values is None:
+            values = self.stages[stage] = collections.deque(maxlen=self.window)
+        values.append(seconds)
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def stage_stats(self):
+        return {stage: StageStats(sum(values) / len(values), max(values), len(values))
+                for stage, values in self.stages.items() if values}
+
+
+class Hud:
+    # Texto de estado en la esquina; se vuelve a componer como mucho cada
+    # 'refresh' segundos para no renderizar fuentes en cada fotograma
+    def __init__(self, instrumentation, font, refresh=0.5):
+        self.instrumentation = instrumentation
+        self.font = font
+        self.refresh = refresh
+        self.visible = True
+        self.surface = None
+        self.last_update = 0.0
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def lines(self, fps):
+        lines = [f"FPS: {fps:.2f}"]
+        for stage, stats in self.instrumentation.stage_stats().items():
+            lines.append(f"{stage}: {stats.mean * 1000:.2f} ms (max {stats.max * 1000:.2f})")
+        for name, value in self.instrumentation.gauges.items():
+            lines.append(f"{name}: {value}")
+        return lines
+
+    def draw(self, screen, fps):
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if self.surface is None or now - self.last_update >= self.refresh:
+            rendered = [self.font.render(line, True, pygame.Color("white")) for line in self.lines(fps)]
+            width = max(surface.get_width() for surface in rendered)
+            height = sum(surface.get_height() for surface in rendered)
+            self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+            y = 0
+            for surface in rendered:
+                self.surface.blit(surface, (width - surface.get_width(), y))
+                y += surface.get_height()
+            self.last_update = now
+        return screen.blit(self.surface, self.surface.get_rect(bottomright=(screen.get_width() - 10, screen.get_height() - 10)))
@@ -0,0 +1,278 @@
+import collections
+import logging
+import time
+
+import numpy as np
+
+from logger import log_message
+
+# Interacciones entre partículas sobre una rejilla uniforme. La rejilla guarda
+# los índices de las partículas ordenados por celda; las consultas de vecinos
+# miran solo las 3x3 celdas alrededor de cada partícula y se resuelven para
+# todas a la vez con NumPy. Las reglas (colisiones, bandada y atracción hacia
+# el centro en los golpes) se configuran en la clave opcional "interactions"
+# de particles_config.json:
+#
+#   "interactions": {
+#       "radius": 40,
+#       "budget_ms": 2.0,
+#       "collision": {"strength": 0.5},
+#       "flocking": {"separation": 0.6, "alignment": 0.1, "cohesion": 0.05},
+#       "attraction": {"strength": 0.4, "decay": 0.92}
+#   }
+
+INTERACTION_RULES = {
+    "collision": ("strength",),
+    "flocking": ("separation", "alignment", "cohesion"),
+    "attraction": ("strength", "decay"),
+}
+NEIGHBOUR_OFFSETS = np.array([(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)])
+# Vecinos que se miran como mucho por celda: en los grupos muy densos basta con una
+# muestra, y así el número de parejas no crece con el cuadrado de la densidad
+MAX_PER_CELL = 4
+# Con stride s, la dirección de cada partícula se recalcula cada s pasos y entre
+# medias se sigue aplicando la última; más allá de este valor las bandadas y las
+# colisiones reaccionan tarde a simple vista. Si ni así cabe en el presupuesto, la
+# muestra por celda se reduce a la mitad hasta MIN_PER_CELL y, como último recurso,
+# el stride sigue creciendo hasta OVERLOAD_STRIDE; solo entonces se avisa
+MAX_STRIDE = 8
+MIN_PER_CELL = 1
+OVERLOAD_STRIDE = 16
+# El ajuste se decide con la media de varios pasos, no con uno suelto, y apunta por
+# debajo del presupuesto para que las variaciones de un paso a otro quepan
+ADJUST_WINDOW = 5
+TARGET_RATIO = 0.75
+RECOVER_RATIO = 0.3
+
+
+def validate_interactions(config, invalid):
+    # 'invalid' construye la excepción con el contexto de la carpeta
+    if not isinstance(config, dict):
+        raise invalid("'interactions' debe ser un objeto")
+    for key in ("radius", "budget_ms"):
+        if key in config and (not isinstance(config[key], (int, float)) or config[key] <= 0):
+            raise invalid(f"'interactions.{key}' debe ser un número positivo")
+    for key, value in config.items():
+        if key in ("radius", "budget_ms"):
+            continue
+        if key not in INTERACTION_RULES:
+            raise invalid(f"interacción desconocida: '{key}'")
+        if not isinstance(value, dict) or not all(isinstance(value.get(name, 0), (int, float)) for name in INTERACTION_RULES[key]):
+            raise invalid(f"'interactions.{key}' debe ser un objeto con {', '.join(INTERACTION_RULES[key])} numéricos")
+    return config
+
+
+class SpatialGrid:
+    # Como de un paso a otro casi ninguna partícula cambia de celda, el orden se
+    # actualiza reordenando el del paso anterior con un algoritmo estable, que
+    # sobre datos casi ordenados cuesta poco más que recorrerlos
+
+    def __init__(self, cell_size, screen_size):
+        self.cell_size = cell_size
+        screen_width, screen_height = screen_size
+        self.columns = int(screen_width // cell_size) + 1
+        self.rows = int(screen_height // cell_size) + 1
+        self.order = None  # Índices de partícula ordenados por celda
+        self.cells = None  # Celda de cada partícula
+        self.starts = None  # Primera posición de cada celda en 'order' (más la celda vacía y el final)
+        # Las 3x3 celdas alrededor de cada celda; fuera de la pantalla, una celda vacía extra
+        empty = self.columns * self.rows
+        column = np.arange(empty) % self.columns
+        row = np.arange(empty) // self.columns
+        neighbour_column = column[:, None] + NEIGHBOUR_OFFSETS[:, 0]
+        neighbour_row = row[:, None] + NEIGHBOUR_OFFSETS[:, 1]
+        valid = (neighbour_column >= 0) & (neighbour_column < self.columns) & (neighbour_row >= 0) & (neighbour_row < self.rows)
+        self.neighbours = np.where(valid, neighbour_row * self.columns + neighbour_column, empty)
+
+    def cell_of(self, x, y):
+        # Se acota antes de convertir a enteros (que trunca): la división entera de
+        # flotantes y np.clip sobre enteros son varias veces más lentos
+        scale = 1 / self.cell_size
+        column = np.minimum(np.maximum(x * scale, 0), self.columns - 1).astype(np.int64)
+        row = np.minimum(np.maximum(y * scale, 0), self.rows - 1).astype(np.int64)
+        return row * self.columns + column
+
+    def update(self, x, y):
+        cells = self.cell_of(x, y)
+        if self.order is None or len(self.order) != len(cells):
+            self.order = np.argsort(cells, kind="stable")
+        elif np.array_equal(cells, self.cells):
+            return
+        else:
+            self.order = self.order[np.argsort(cells[self.order], kind="stable")]
+        self.cells = cells
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.columns * self.rows + 2))
+
+    def pairs(self, x, y, radius, query=None, max_per_cell=None):
+        # Parejas (i, j), i != j, a menos de 'radius' (que no puede superar el tamaño
+        # de celda), con i en 'query' (todas si es None) y como mucho 'max_per_cell'
+        # candidatos por celda vecina. Devuelve i, j y el vector de i a j
+        if query is None:
+            query = np.arange(len(x))
+        neighbour = self.neighbours[self.cells[query]]
+        start = self.starts[neighbour]
+        counts = self.starts[neighbour + 1] - start
+        if max_per_cell is not None:
+            # Cada partícula empieza en un punto distinto de la celda para no ver siempre a las mismas
+            available = counts
+            counts = np.minimum(counts, max_per_cell)
+            start = start + (query[:, None] * 7919) % np.maximum(available - counts + 1, 1)
+        counts = counts.ravel()
+
+        # Expande cada (partícula, celda vecina) en tantas parejas como partículas tenga la celda
+        total = int(counts.sum())
+        first = np.repeat(start.ravel() - (np.cumsum(counts) - counts), counts)
+        j = self.order[first + np.arange(total)]
+        i = np.repeat(np.repeat(query, len(NEIGHBOUR_OFFSETS)), counts)
+        dx = x[j] - x[i]
+        dy = y[j] - y[i]
+        # Un solo recorrido de la máscara para las cuatro salidas
+        near = np.flatnonzero((i != j) & (dx * dx + dy * dy < radius * radius))
+        return i[near], j[near], dx[near], dy[near]
+
+
+class ParticleInteractions:
+    def __init__(self, config, screen_size, max_size):
+        self.screen_width, self.screen_height = screen_size
+        self.radius = float(config.get("radius", 40))
+        self.collision = config.get("collision")
+        self.flocking = config.get("flocking")
+        self.attraction = config.get("attraction")
+        # Las colisiones necesitan ver a vecinos a distancia de dos tamaños máximos
+        reach = max(self.radius, 2 * max_size) if self.collision else self.radius
+        self.grid = SpatialGrid(reach, screen_size)
+        self.reach = reach
+        self.budget = config.get("budget_ms", 2.0) / 1000
+        # Con muchas partículas cada paso atiende solo a una de cada 'stride', por turnos
+        self.stride = 1
+        self.phase = 0
+        self.per_cell = MAX_PER_CELL  # Vecinos por celda; baja cuando ya no queda stride
+        # Giro por paso de cada partícula según sus vecinos; se renueva en su turno y se
+        # aplica en todos los pasos hasta el siguiente
+        self.turn_x = None
+        self.turn_y = None
+        self.attraction_level = 0.0
+        self.last_duration = 0.0
+        self.durations = collections.deque(maxlen=ADJUST_WINDOW)  # Pasos desde el último ajuste
+
+    def pulse(self):
+        # Golpe de audio: las partículas se dirigen al centro y el efecto se desvanece
+        self.attraction_level = 1.0
+
+    def apply(self, particles):
+        start = time.perf_counter()
+        x, y, angle = particles.x, particles.y, particles.angle
+        n = len(x)
+        steer_x = np.zeros(n)
+        steer_y = np.zeros(n)
+        if self.turn_x is None or len(self.turn_x) != n:
+            self.turn_x = np.zeros(n)
+            self.turn_y = np.zeros(n)
+        # Dirección actual de todas las partículas, para la alineación y para girarlas al final.
+        # En float32 el seno y el coseno son varias veces más rápidos y sobra precisión
+        single = angle.astype(np.float32)
+        cos_angle = np.cos(single)
+        sin_angle = np.sin(single)
+
+        if self.collision or self.flocking:
+            self.grid.update(x, y)
+            query = None
+            # Las sumas por partícula se hacen sobre 'slots' posiciones (las del turno), no sobre n
+            slots = n
+            if self.stride > 1:
+                query = np.arange(self.phase, n, self.stride)
+                slots = len(query)
+            i, j, dx, dy = self.grid.pairs(x, y, self.reach, query, self.per_cell)
+            slot = i if query is None else (i - self.phase) // self.stride
+            if query is not None:
+                self.phase = (self.phase + 1) % self.stride
+            distance = np.maximum(np.sqrt(dx * dx + dy * dy), 1e-6)
+            unit_x, unit_y = dx / distance, dy / distance
+            # Todas las reglas se suman por pareja y se acumulan con un solo bincount por eje
+            pair_x = np.zeros(len(i))
+            pair_y = np.zeros(len(i))
+
+            if self.collision:
+                overlap = particles.size[i] + particles.size[j] - distance
+                touching = overlap > 0
+                push = np.where(touching, overlap, 0) * self.collision.get("strength", 0.5) * 0.5
+                if query is None:
+                    x -= np.bincount(slot, unit_x * push, minlength=slots)
+                    y -= np.bincount(slot, unit_y * push, minlength=slots)
+                else:
+                    x[query] -= np.bincount(slot, unit_x * push, minlength=slots)
+                    y[query] -= np.bincount(slot, unit_y * push, minlength=slots)
+                pair_x -= np.where(touching, unit_x, 0)
+                pair_y -= np.where(touching, unit_y, 0)
+
+            if self.flocking:
+                near = distance < self.radius
+                count = np.maximum(np.bincount(slot[near], minlength=slots), 1)[slot]
+                closeness = np.where(near, 1 - distance / self.radius, 0)
+                separation = self.flocking.get("separation", 0) * closeness
+                alignment = np.where(near, self.flocking.get("alignment", 0) / count, 0)
+                cohesion = np.where(near, self.flocking.get("cohesion", 0) / count / self.radius, 0)
+                pair_x += -unit_x * separation + cos_angle[j] * alignment + dx * cohesion
+                pair_y += -unit_y * separation + sin_angle[j] * alignment + dy * cohesion
+
+            if query is None:
+                self.turn_x = np.bincount(slot, pair_x, minlength=slots)
+                self.turn_y = np.bincount(slot, pair_y, minlength=slots)
+            else:
+                self.turn_x[query] = np.bincount(slot, pair_x, minlength=slots)
+                self.turn_y[query] = np.bincount(slot, pair_y, minlength=slots)
+            steer_x += self.turn_x
+            steer_y += self.turn_y
+
+        if self.attraction and self.attraction_level > 0.01:
+            to_x = self.screen_width / 2 - x
+            to_y = self.screen_height / 2 - y
+            distance = np.maximum(np.sqrt(to_x * to_x + to_y * to_y), 1e-6)
+            strength = self.attraction.get("strength", 0.4) * self.attraction_level
+            steer_x += to_x / distance * strength
+            steer_y += to_y / distance * strength
+            self.attraction_level *= self.attraction.get("decay", 0.92)
+
+        # Solo cambia la dirección: la rapidez de cada partícula sigue siendo la suya
+        heading_x = cos_angle + steer_x
+        heading_y = sin_angle + steer_y
+        np.arctan2(heading_y, heading_x, out=angle)
+
+        self.last_duration = time.perf_counter() - start
+        self.durations.append(self.last_duration)
+        if len(self.durations) == ADJUST_WINDOW:
+            self.adjust(sum(self.durations) / ADJUST_WINDOW, n)
+
+    def adjust(self, average, n):
+        target = self.budget * TARGET_RATIO
+        if average > target:
+            if self.stride < MAX_STRIDE:
+                # Salta directamente al stride que cabría en el objetivo
+                self.stride = min(MAX_STRIDE, max(self.stride * 2, int(self.stride * average / target) + 1))
+            elif self.per_cell > MIN_PER_CELL:
+                self.per_cell //= 2
+            elif self.stride < OVERLOAD_STRIDE:
+                self.stride = min(OVERLOAD_STRIDE, self.stride * 2)
+            elif average > self.budget:
+                log_message(f"Interacciones fuera de presupuesto: {average * 1000:.1f} ms con {n} partículas "
+                            f"(máximo {self.budget * 1000:.1f} ms)", logging.WARNING, rate_key="interactions_budget",
+                            rate_interval=10.0)
+                return
+            else:
+                return
+        elif average < self.budget * RECOVER_RATIO:
+            # Se recupera en orden inverso: el stride de último recurso, la muestra por celda y el stride
+            if self.stride > MAX_STRIDE:
+                self.stride //= 2
+                self.phase %= self.stride
+            elif self.per_cell < MAX_PER_CELL:
+                self.per_cell *= 2
+            elif self.stride > 1:
+                self.stride //= 2
+                self.phase %= self.stride
+            else:
+                return
+        else:
+            return
+        # Los pasos medidos con el ajuste anterior ya no sirven
+        self.durations.clear()
@@ -0,0 +1,189 @@
+import collections
+import logging
+import math
+import random
+import threading
+
+import numpy as np
+import pygame
+
+from logger import log_message
+
+# Escala del lienzo reducido donde se dibuja el resplandor antes de ampliarlo
+GLOW_DOWNSCALE = 8
+GLOW_COLOR = (150, 170, 255, 160)
+
+# Subdivisiones de cada rama y desviación del punto medio relativa al segmento
+DISPLACEMENT_LEVELS = 4
+DISPLACEMENT_ROUGHNESS = 0.12
+
+
+class LightningManager(threading.Thread):
+    # Servicio en segundo plano que genera relámpagos (con su sprite ya
+    # rasterizado) y mantiene lleno un conjunto acotado. El bucle principal los
+    # toma sin esperar nunca; cada uno se usa una vez y pasa a los recientes,
+    # que solo se repiten si el generador no ha tenido tiempo de reponer.
+
+    def __init__(self, screen_width, screen_height, num_branches, pool_size=8, recent_size=4, seed=None):
+        super().__init__()
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.num_branches = num_branches
+        self.pool_size = pool_size
+        self.pool = collections.deque()  # Relámpagos sin usar
+        self.recent = collections.deque(maxlen=recent_size)  # Ya usados, de reserva
+        self.wanted = threading.Event()  # Activado cuando falta algún relámpago en el conjunto
+        self.wanted.set()
+        self.rng = np.random.default_rng(seed)
+        self.generated = 0
+        self.daemon = True
+        self.running = True
+
+    def run(self):
+        while self.running:
+            if len(self.pool) >= self.pool_size:
+                self.wanted.clear()
+                # Se vuelve a comprobar por si se tomó uno entre la comprobación y el clear
+                if len(self.pool) >= self.pool_size:
+                    self.wanted.wait()
+                continue
+            self.generate()
+
+    def generate(self):
+        # Añade un relámpago al conjunto; sin arrancar el hilo, quien lo llama decide cuándo
+        lightning = Lightning(self.screen_width, self.screen_height, (self.screen_width // 2, 0), self.num_branches, rng=self.rng)
+        lightning.sprite = LightningSprite(lightning, (self.screen_width, self.screen_height))
+        self.pool.append(lightning)
+        self.generated += 1
+        log_message("Relámpago generado", logging.DEBUG, total=self.generated, disponibles=len(self.pool))
+
+    def get_random_lightning(self):
+        # Nunca bloquea: devuelve uno nuevo si hay, si no uno reciente, o None al arrancar
+        try:
+            lightning = self.pool.popleft()
+        except IndexError:
+            return random.choice(self.recent) if self.recent else None
+        self.recent.append(lightning)
+        self.wanted.set()
+        return lightning
+
+    def get_sprite(self, lightning):
+        return lightning.sprite
+
+    def memory_usage(self):
+        lightnings = {id(lightning): lightning for lightning in list(self.pool) + list(self.recent)}
+        return sum(lightning.sprite.memory_usage() for lightning in lightnings.values())
+
+    def stop(self):
+        self.running = False
+        self.wanted.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+
+class Lightning:
+    # Árbol de ramas generado por niveles de profundidad: cada nivel se calcula
+    # para todas las ramas a la vez y cada rama se quiebra con desplazamiento
+    # del punto medio, también vectorizado.
+
+    def __init__(self, screen_width, screen_height, start_pos, num_branches, max_depth=3, rng=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.start_pos = start_pos
+        self.num_branches = num_branches
+        self.color = (255, 255, 255)
+        self.max_depth = max_depth  # Profundidad máxima de ramificación
+        self.rng = rng or np.random.default_rng()
+        self.paths = []  # (puntos de la rama, profundidad)
+
+        starts = np.tile(np.asarray(start_pos, dtype=np.float64), (num_branches, 1))
+        for depth in range(max_depth + 1):
+            if len(starts) == 0:
+                break
+            ends = self.generate_ends(starts)
+            for points in self.displace(starts, ends):
+                self.paths.append((points, depth))
+            if depth < max_depth:
+                # Cada rama tiene entre 0 y 3 sub-ramas que parten de su extremo
+                starts = np.repeat(ends, self.rng.integers(0, 3, len(ends), endpoint=True), axis=0)
+
+    def generate_ends(self, starts):
+        n = len(starts)
+        length = self.rng.integers(100, 300, n, endpoint=True)
+        # Evitar ángulos entre -40° a 40°
+        angle = np.where(self.rng.random(n) < 0.5,
+                         self.rng.uniform(-math.pi, -math.pi / 4.5, n),
+                         self.rng.uniform(math.pi / 4.5, math.pi, n))
+        return starts + np.column_stack((np.cos(angle), np.sin(angle))) * length[:, None]
+
+    def displace(self, starts, ends):
+        # Cada nivel inserta el punto medio de todos los segmentos desplazado en
+        # perpendicular, en proporción a la longitud del segmento
+        points = np.stack((starts, ends), axis=1)
+        for _ in range(DISPLACEMENT_LEVELS):
+            segments = points[:, 1:] - points[:, :-1]
+            normals = np.stack((-segments[..., 1], segments[..., 0]), axis=-1)
+            offsets = self.rng.normal(0.0, DISPLACEMENT_ROUGHNESS, segments.shape[:2] + (1,))
+            refined = np.empty((len(points), 2 * points.shape[1] - 1, 2))
+            refined[:, ::2] = points
+            refined[:, 1::2] = (points[:, :-1] + points[:, 1:]) / 2 + normals * offsets
+            points = refined
+        return points
+
+    def draw(self, screen):
+        for points, _ in self.paths:
+            pygame.draw.lines(screen, self.color, False, points.tolist(), 2)
+
+
+class LightningSprite:
+    # Relámpago rasterizado una sola vez: una capa recortada por nivel de
+    # profundidad, con resplandor. Revelar las capas en orden anima el rayo de
+    # forma progresiva con unos pocos blits por fotograma.
+
+    def __init__(self, lightning, screen_size):
+        self.screen_rect = pygame.Rect((0, 0), screen_size)
+        self.layers = []
+        by_depth = {}
+        for points, depth in lightning.paths:
+            by_depth.setdefault(depth, []).append(points)
+        for depth in sorted(by_depth):
+            layer = self.render_layer(by_depth[depth], depth, lightning.color)
+            if layer is not None:
+                self.layers.append(layer)
+
+    def render_layer(self, paths, depth, color):
+        glow_width = 12
+        points = np.concatenate(paths)
+        low, high = points.min(axis=0), points.max(axis=0)
+        bounds = pygame.Rect(int(low[0]) - glow_width, int(low[1]) - glow_width,
+                             int(high[0] - low[0]) + 2 * glow_width, int(high[1] - low[1]) + 2 * glow_width)
+        bounds = bounds.clip(self.screen_rect)
+        if bounds.width == 0 or bounds.height == 0:
+            return None
+
+        # Resplandor: líneas gruesas a media resolución que se promedian al reducir
+        # el lienzo y quedan difuminadas al ampliarlo de nuevo
+        glow = pygame.Surface((max(1, bounds.width // 2), max(1, bounds.height // 2)), pygame.SRCALPHA)
+        origin = np.asarray(bounds.topleft)
+        for path in paths:
+            pygame.draw.lines(glow, GLOW_COLOR, False, ((path - origin) / 2).tolist(), max(1, glow_width // 2 - depth))
+        small_size = (max(1, bounds.width // GLOW_DOWNSCALE), max(1, bounds.height // GLOW_DOWNSCALE))
+        glow = pygame.transform.smoothscale(glow, small_size)
+        layer = pygame.transform.smoothscale(glow, bounds.size)
+
+        # Núcleo del rayo, más fino en las ramas profundas
+        for path in paths:
+            pygame.draw.lines(layer, color, False, (path - origin).tolist(), max(1, 3 - depth))
+        if pygame.display.get_surface() is not None:
+            layer = layer.convert_alpha()
+        return layer, bounds.topleft
+
+    def draw(self, screen, progress=1.0, alpha=255):
+        # 'progress' entre 0 y 1 indica qué fracción de los niveles se muestra
+        visible = math.ceil(max(0.0, min(1.0, progress)) * len(self.layers))
+        for surface, position in self.layers[:visible]:
+            surface.set_alpha(alpha)
+            screen.blit(surface, position)
+
+    def memory_usage(self):
+        return sum(surface.get_bytesize() * surface.get_width() * surface.get_height() for surface, _ in self.layers)
@@ -0,0 +1,40 @@
+import math
+import time
+
+import pygame
+
+# Pantalla de carga: aparece nada más abrir la ventana y se repinta mientras la
+# primera carpeta se carga en segundo plano. Solo usa primitivas de pygame y
+# la fuente ya abierta, para no retrasar su aparición.
+
+BACKGROUND_COLOR = (0, 0, 0)
+TEXT_COLOR = (200, 200, 200)
+SPINNER_DOTS = 12
+SPINNER_RADIUS = 24
+SPINNER_PERIOD = 1.2  # Segundos por vuelta
+
+
+class LoadingScene:
+    def __init__(self, screen, font):
+        self.screen = screen
+        self.font = font
+        self.start = time.perf_counter()
+        self.message = None
+        self.text = None
+
+    def draw(self, message):
+        if message != self.message:
+            self.message = message
+            self.text = self.font.render(message, True, TEXT_COLOR)
+        self.screen.fill(BACKGROUND_COLOR)
+        center_x, center_y = self.screen.get_rect().center
+        self.screen.blit(self.text, self.text.get_rect(center=(center_x, center_y + 2 * SPINNER_RADIUS)))
+
+        # Puntos en círculo; el más brillante gira y los demás se apagan tras él
+        phase = (time.perf_counter() - self.start) / SPINNER_PERIOD % 1
+        for dot in range(SPINNER_DOTS):
+            fraction = dot / SPINNER_DOTS
+            brightness = int(255 * (1 - (phase - fraction) % 1))
+            angle = 2 * math.pi * fraction - math.pi / 2
+            position = (center_x + SPINNER_RADIUS * math.cos(angle), center_y - SPINNER_RADIUS + SPINNER_RADIUS * math.sin(angle))
+            pygame.draw.circle(self.screen, (brightness, brightness, brightness), position, 3)
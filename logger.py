@@ -0,0 +1,97 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+# Registro con niveles que escribe desde un hilo en segundo plano: quien llama
+# solo encola el registro, y el formateo con colores y el print se hacen fuera
+# del bucle principal. Los mensajes repetitivos se pueden limitar por clave.
+
+CONSOLE_TAG = "\033[32m[@Console]\033[0m"
+LEVEL_COLORS = {logging.DEBUG: "\033[90m", logging.WARNING: "\033[33m", logging.ERROR: "\033[31m"}
+
+logger = logging.getLogger("vis")
+logger.propagate = False
+listener = None
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        message = record.getMessage()
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        color = LEVEL_COLORS.get(record.levelno)
+        if color:
+            message = f"{color}{record.levelname}\033[0m {message}"
+        return f"{CONSOLE_TAG} {message}"
+
+
+class RateLimitFilter(logging.Filter):
+    # Deja pasar como mucho un mensaje por clave cada 'interval' segundos e indica
+    # cuántos se han omitido entre medias
+    def __init__(self):
+        super().__init__()
+        self.last_emit = {}
+        self.suppressed = {}
+
+    def filter(self, record):
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        if now - self.last_emit.get(key, -record.rate_interval) < record.rate_interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False
+        self.last_emit[key] = now
+        skipped = self.suppressed.pop(key, 0)
+        if skipped:
+            record.msg = f"{record.msg} ({skipped} omitidos)"
+        return True
+
+
+def configure(level=logging.INFO, stream=None):
+    # Sustituye los manejadores: QueueHandler en quien llama, QueueListener escribe
+    global listener
+    shutdown()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    console = logging.StreamHandler(stream or sys.stdout)
+    console.setFormatter(ConsoleFormatter())
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    # El registro se encola tal cual; el formateo ocurre en el hilo del listener
+    queue_handler.prepare = lambda record: record
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, console)
+    listener.start()
+    return logger
+
+
+def shutdown():
+    # Vacía la cola pendiente y detiene el hilo de escritura
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def log_message(message, level=logging.INFO, rate_key=None, rate_interval=1.0, **fields):
+    # Comprobar el nivel primero hace que un mensaje descartado no cueste casi nada
+    if not logger.isEnabledFor(level):
+        return
+    extra = {"fields": fields}
+    if rate_key is not None:
+        extra["rate_key"] = rate_key
+        extra["rate_interval"] = rate_interval
+    logger.log(level, message, extra=extra)
+
+
+configure()
+atexit.register(shutdown)
@@ -1,164 +1,88 @@
+import time
+
+# Referencia del tiempo hasta el primer fotograma, tomada antes de las importaciones pesadas
+PROCESS_START = time.perf_counter()
+
+import argparse
+import logging
 import os
 import threading
 import numpy as np
 import json
-from PIL import Image
-import sounddevice as sd
 import pygame
 import math
-import random
-import time
 import concurrent.futures
 import collections
-import pyaudio
-
-class LightningManager():
-    def __init__(self, screen_width, screen_height, num_branches, num_lightnings=50):
-        super().__init__()
-        self.screen_width = screen_width
-        self.screen_height = screen_height
-        self.num_branches = num_branches
-        self.lightnings = []
-        self.num_lightnings = num_lightnings
-        self.daemon = True
-        self.running = True
-        self.current_index = 0
-
-    def precalculate_lightnings(self):
-        # Precalcular una cantidad específica de relámpagos
-        for _ in range(self.num_lightnings):
-            log_message("Generando relámpago" + str(len(self.lightnings) + 1) + " de " + str(self.num_lightnings))
-            lightning = Lightning(self.screen_width, self.screen_height, (self.screen_width // 2, 0), self.num_branches)
-            self.lightnings.append(lightning)
+import multiprocessing
+from audio_analysis import SILENCE, AudioAnalyzer, RingBuffer
+from audio_sources import PyAudioSource, create_audio_source
+from bundle import DEFAULT_CENTER_SCALE_STEP, build_bundle, bundle_path, load_bundle, scene_settings
+from compositor import Compositor
+from effects import EFFECTS, EffectsPipeline, selected_effects
+from framesink import DEFAULT_NAME as DEFAULT_FRAME_SINK, FrameSink
+from frame_cache import FrameCache, cache_key
+from frames import (SYMMETRY_TOLERANCE, center_ladder, frame_angles, performance_test, render_base_frame, render_rotated_frame,
+                    rotational_symmetry)
+from instrumentation import Hud, Instrumentation
+from lightning import LightningManager
+from loading import LoadingScene
+from logger import configure as configure_logging, log_message
+from particles import ParticleSystem, SimulationWorker, validate_particle_config
+from quality import QUALITY_LEVELS, QualityGovernor, get_quality_level
+from rotation import RotatedImage, RotationFrames, keyframe_indices
+from ThunderEfect import TRANSITIONS, create_transition
+from watcher import FolderWatcher
+
+# Memoria máxima para carpetas residentes (la actual y la siguiente siempre se conservan)
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+REBUILD_NICENESS = 10  # Prioridad más baja del proceso que recompila paquetes de escena
+MEMORY_REPORT_INTERVAL = 60000  # Milisegundos entre dos informes de memoria por carpeta
+CENTER_BLEND_STEPS = 4  # Fundidos entre dos niveles vecinos de la imagen central en el modo suave
+
+
+def to_display_surface(frame):
+    surface = pygame.image.frombuffer(frame.data, frame.size, frame.format)
+    if pygame.display.get_surface() is None:
+        return surface
+    # Formato nativo de la pantalla: sin canal alfa si el fotograma es opaco
+    if np.frombuffer(frame.data, dtype=np.uint8)[3::4].min() == 255:
+        return surface.convert()
+    return surface.convert_alpha()
 
 
-    def get_random_lightning(self):
-        
-        num_lightnings = len(self.lightnings)
-        if num_lightnings == 0:
-            return None
-        else:
-            return self.lightnings[random.randint(0, num_lightnings - 1)]
-    
-    def stop(self):
-        self.running = False
-
-class Particle:
-    def __init__(self, config, screen_size):
-        self.color = self.get_color(config["color"])
-        self.size = random.randint(config["size_min"], config["size_max"])
-        self.velocity_range = config["velocity_range"]
-        self.screen_width, self.screen_height = screen_size
-        self.x = random.randint(0, self.screen_width)
-        self.y = random.randint(0, self.screen_height)
-        self.velocity = random.uniform(self.velocity_range[0], self.velocity_range[1])
-        self.angle = random.uniform(0, 2 * math.pi)
-        self.base_size = random.randint(config["size_min"], config["size_max"])
-        self.size_min = config["size_min"]
-        self.size_max = config["size_max"]
-        self.image = self.get_image(config.get("src")) if "src" in config else None
-        self.original_image = self.get_image(config.get("src")) if "src" in config else None
-
-    def get_color(self, color_config):
-        if color_config == "random":
-            return [random.randint(0, 255) for _ in range(3)]
-        else:
-            return color_config
-
-    def update(self):
-        self.x += math.cos(self.angle) * self.velocity
-        self.y += math.sin(self.angle) * self.velocity
-        if self.x < 0 or self.x > self.screen_width:
-            self.angle = math.pi - self.angle
-        if self.y < 0 or self.y > self.screen_height:
-            self.angle = -self.angle
-    
-    def update_size(self, volume_level):
-        new_size = self.base_size + (volume_level - 0.5) * 10
-        self.size = max(self.size_min, min(new_size, self.size_max))
-
-        if self.image:
-            self.image = pygame.transform.scale(self.original_image, (self.size, self.size))
-        
-    def update_visibility(self, is_loud):
-        if is_loud:
-            self.size = min(self.size_max, self.size + 1) 
-        else:
-            self.size = max(self.size_min, self.size - 1)
-
-    def get_image(self, src):
-        try:
-            image = pygame.image.load(src)
-            return image  # Devuelve la imagen sin escalar
-        except pygame.error:
-            return None
-
-    
-    def draw(self, screen):
-        if self.image:
-            screen.blit(self.image, (int(self.x), int(self.y)))
-        else:
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.size)
-    
-class Lightning:
-    def __init__(self, screen_width, screen_height, start_pos, num_branches, max_depth=3):
-        self.screen_width = screen_width
-        self.screen_height = screen_height
-        self.start_pos = start_pos
-        self.branches = []
-        self.num_branches = num_branches
-        self.color = (255, 255, 255)
-        self.max_depth = max_depth  # Profundidad máxima de ramificación
-
-        # Iniciar la generación de ramas
-        self.generate_branches(self.start_pos, self.num_branches)
-
-    def generate_branches(self, start_pos, num_branches, depth=0):
-        if depth > self.max_depth:
-            return
-
-        for _ in range(num_branches):
-            length = random.randint(100, 300)
-
-            # Evitar ángulos entre -40° a 40°
-            if random.random() < 0.5:
-                angle = random.uniform(-math.pi, -math.pi / 4.5)  # Ángulos hacia la izquierda y abajo
-            else:
-                angle = random.uniform(math.pi / 4.5, math.pi)  # Ángulos hacia la derecha y abajo
-
-            dx = math.cos(angle) * length
-            dy = math.sin(angle) * length  # Permitir que dy sea positivo o negativo
-
-            end_pos = (start_pos[0] + dx, start_pos[1] + dy)
-
-            self.branches.append((start_pos, end_pos, self.num_branches - depth))
-
-            sub_branches_count = random.randint(0, 3) if depth < self.max_depth else 0
-
-            for _ in range(sub_branches_count):
-                self.generate_branches(end_pos, 1, depth + 1)
-
-
-
-    def draw(self, screen):
-        i = 0
-        for branch in self.branches:
-            pygame.draw.line(screen, self.color, branch[0], branch[1], 2)
-            i += 1
-            
 class ImageFolder:
-    def __init__(self, path, screen_size):
+    def __init__(self, path, screen_size, frame_cache=None, process_pool=None,
+                 center_scale_step=DEFAULT_CENTER_SCALE_STEP, smooth_center=False, use_bundle=True, seed=None):
         log_message(f"Cargando carpeta: {path}")
         self.path = path
+        self.seed = seed  # Con la misma semilla, las partículas salen iguales en cualquier proceso
+        self.get_ticks = pygame.time.get_ticks  # Reloj en ms; el render offline usa uno simulado
+        self.frame_cache = frame_cache or FrameCache()
+        self.process_pool = process_pool  # Si se indica, las rotaciones se generan en otros procesos
         self.screen_width, self.screen_height = screen_size
+        self.settings = scene_settings(screen_size, center_scale_step)
         self.angle_index = 0
         self.rotation_speed = 3
-        self.fps_background = 2
-        self.load_images()
-        self.load_particle_config(screen_size)
-        self.center_scale = 0.3
+        self.fps_background = self.settings["fps_background"]
+        self.angle_stride = 1  # Salto entre fotogramas de rotación, según el nivel de calidad
+        self.center_quantization = 1  # Niveles de la escalera central que se agrupan
+        self.center_scale = self.settings["center_scale"]
         self.background_scale = 0.6
-        self.preload_images()
+        self.max_scale = self.settings["max_scale"]  # Escala máxima de la imagen central
+        self.center_scale_step = center_scale_step
+        self.smooth_center = smooth_center  # Funde los dos niveles vecinos de la escalera
+        self.center_blends = {}  # (nivel inferior, paso) -> fundido, creado al primer uso
+
+        # Con un paquete de escena al día no hace falta decodificar ni escalar nada
+        bundle = load_bundle(path, self.settings) if use_bundle else None
+        self.from_bundle = bundle is not None
+        if bundle is not None:
+            self.load_bundle(bundle, screen_size)
+        else:
+            self.load_images()
+            self.load_particle_config(screen_size)
+            self.preload_images()
+            self.preload_center_images()
         self.pause_rotation = False
         self.volume_level = 0
         self.pause_duration = 200  # Duración de la pausa en milisegundos
@@ -168,107 +92,214 @@ class ImageFolder:
         log_message("Cargando imágenes...")
 
         # 1MB y 800x600 son los límites de tamaño y resolución
-        max_file_size = 1024 * 1024
-        max_resolution = 800 * 600 
-
-        self.original_bg = performance_test(os.path.join(self.path, "background.png"), max_file_size, max_resolution)
-        self.center_image = performance_test(os.path.join(self.path, "center.png"), max_file_size, max_resolution)
-        self.background_image = self.scale_to_fit(self.original_bg)
-
+        self.max_file_size = self.settings["max_file_size"]
+        self.max_resolution = self.settings["max_resolution"]
+
+        self.background_path = os.path.join(self.path, "background.png")
+        self.center_image = performance_test(os.path.join(self.path, "center.png"), self.max_file_size, self.max_resolution)
+        self.center_size = self.center_image.size
+
+    def load_bundle(self, bundle, screen_size):
+        log_message(f"Cargando paquete de escena [{self.path}]")
+        self.center_size = bundle.center_size
+        self.particle_config = bundle.config
+        base = bundle.frames.get("background_base", [None])[0]
+        self.set_rotated_images(bundle.rotation_angles, bundle.rotation_index,
+                                dict(zip(bundle.keyframes, bundle.frames["background"])), base)
+        self.center_images = [to_display_surface(frame) for frame in bundle.frames["center"]]
+
+        variants = {group: [to_display_surface(frame) for frame in frames] for group, frames in bundle.sprite_variants().items()}
+        self.particles = ParticleSystem(self.particle_config["particle_properties"], self.particle_config["total_particles"],
+                                        screen_size, rng=np.random.default_rng(self.seed), sprite_variants=variants,
+                                        interactions=self.particle_config.get("interactions"))
+        self.particle_thread = SimulationWorker(self.particles)
+
+    def load_background(self):
+        # El fondo solo se decodifica si hay que generar los fotogramas rotados
+        self.original_bg = performance_test(self.background_path, self.max_file_size, self.max_resolution)
 
     def preload_images(self):
-        self.rotated_images = []
-        for angle in range(0, 360, self.fps_background):
-            rotated_image = self.original_bg.rotate(angle, expand=True)
-            scaled_image = self.scale_to_fit(rotated_image)
-            self.rotated_images.append(pygame.image.fromstring(scaled_image.tobytes(), scaled_image.size, scaled_image.mode))
-            log_message(f"Pre-cargando imagen rotada [{self.path}]: {angle} grados")
-    
+        rotation = self.particle_config["rotation"]
+        if rotation["mode"] == "precomputed":
+            self.preload_all_rotations()
+            return
+        # El resto de fotogramas se genera bajo demanda a partir de la imagen base
+        screen_size = (self.screen_width, self.screen_height)
+        self.load_background()
+        angles, index = frame_angles(self.fps_background, rotational_symmetry(self.original_bg))
+        keyframes = {frame: render_rotated_frame(self.original_bg, angles[frame], screen_size)
+                     for frame in keyframe_indices(rotation, len(angles))}
+        self.set_rotated_images(angles, index, keyframes, render_base_frame(self.original_bg, angles, screen_size))
+
+    def preload_all_rotations(self):
+        screen_size = (self.screen_width, self.screen_height)
+        key = cache_key(self.background_path, screen_size, self.fps_background, self.max_file_size, self.max_resolution, SYMMETRY_TOLERANCE)
+        cached = self.frame_cache.load(self.path, key, screen_size)
+        if cached is not None:
+            frames, index = cached
+            log_message(f"Imágenes rotadas cargadas desde caché [{self.path}]")
+        else:
+            self.load_background()
+            period = rotational_symmetry(self.original_bg)
+            if period < 360:
+                log_message(f"Simetría rotacional de {period} grados en [{self.path}]")
+            angles, index = frame_angles(self.fps_background, period)
+            if self.process_pool is not None:
+                from frame_pool import render_frames_parallel
+
+                log_message(f"Pre-cargando {len(angles)} imágenes rotadas en paralelo [{self.path}]")
+                frames = render_frames_parallel(self.process_pool, get_max_workers(), self.background_path,
+                                                self.max_file_size, self.max_resolution, screen_size, angles)
+            else:
+                frames = []
+                for angle in angles:
+                    frames.append(render_rotated_frame(self.original_bg, angle, screen_size))
+                    log_message(f"Pre-cargando imagen rotada [{self.path}]: {angle} grados", logging.DEBUG)
+
+            try:
+                self.frame_cache.store(self.path, key, screen_size, frames, index)
+            except OSError as e:
+                log_message(f"No se pudo guardar la caché de [{self.path}]: {e}", logging.WARNING)
+
+        angles = list(range(0, len(frames) * self.fps_background, self.fps_background))
+        self.set_rotated_images(angles, index, dict(enumerate(frames)))
+
+    def set_rotated_images(self, angles, index, keyframes, base=None):
+        # 'keyframes' son los fotogramas ya generados, por número de fotograma; los
+        # pasos de rotación simétricos comparten la misma superficie
+        rotation = self.particle_config["rotation"]
+        images = {frame: RotatedImage(to_display_surface(rendered), rendered.offset) for frame, rendered in keyframes.items()}
+        base_surface = None
+        if base is not None:
+            log_message(f"Rotación '{rotation['mode']}' [{self.path}]: {len(images)} de {len(angles)} fotogramas generados al cargar")
+            base_surface = pygame.image.frombuffer(base.data, base.size, base.format)
+            if pygame.display.get_surface() is not None:
+                # Con alfa, rotozoom deja transparentes las esquinas
+                base_surface = base_surface.convert_alpha()
+        self.rotated_images = RotationFrames(angles, index, images, (self.screen_width, self.screen_height),
+                                             base_surface, rotation["cache_size"])
+
+    def memory_usage(self):
+        # Bytes ocupados por las superficies de la carpeta, la imagen central y las partículas
+        total = sum(surface.get_bytesize() * surface.get_width() * surface.get_height()
+                    for surface in self.center_images + list(self.center_blends.values()))
+        return self.rotated_images.memory_usage() + total + self.particles.memory_usage()
+
     def update_volume_level(self, level):
         self.volume_level = level
     
     def update_rotation_pause(self, is_loud):
         if is_loud:
-            self.pause_rotation_start_time = pygame.time.get_ticks()
+            self.pause_rotation_start_time = self.get_ticks()
         self.pause_rotation = is_loud
 
     def update_particle_size(self, volume_level):
-        for particle in self.particles:
-            particle.update_size(volume_level)
+        # El simulador es el único que modifica las partículas
+        self.particle_thread.set_volume(volume_level)
+
+    def update_particle_attraction(self):
+        self.particle_thread.submit(self.particles.pulse_attraction)
+
+    def apply_quality(self, level):
+        self.angle_stride = level.angle_stride
+        self.center_quantization = level.center_quantization
+        self.particles.set_active_fraction(level.particle_fraction)
+
+    def background_index(self):
+        index = int(self.angle_index // self.fps_background) % len(self.rotated_images)
+        return index - index % self.angle_stride
 
-    def update_particle_visibility(self, is_loud):
-        for particle in self.particles:
-            particle.update_visibility(is_loud)
-    
     def get_background_image(self):
-        current_time = pygame.time.get_ticks()
+        return self.rotated_images[self.next_background_index()]
+
+    def next_background_index(self):
+        # Índice del fotograma de fondo a mostrar; avanza la rotación si no está en pausa
+        current_time = self.get_ticks()
         if self.pause_rotation and current_time - self.pause_rotation_start_time < self.pause_duration:
-            return self.rotated_images[int(self.angle_index // self.fps_background) % len(self.rotated_images)]
+            return self.background_index()
         else:
             self.pause_rotation = False
-            image_index = int(self.angle_index // self.fps_background) % len(self.rotated_images)
+            image_index = self.background_index()
             self.angle_index = int((self.angle_index + self.rotation_speed) % 360)
-            return self.rotated_images[image_index]
-
-    def scale_to_fit(self, image):
-        image_ratio = image.width / image.height
-        screen_ratio = self.screen_width / self.screen_height
-        if image_ratio > screen_ratio:
-            new_width = self.screen_width
-            new_height = int(new_width / image_ratio)
-        else:
-            new_height = self.screen_height
-            new_width = int(new_height * image_ratio)
-        resized_image = image.resize((new_width, new_height), Image.ANTIALIAS)
-        # Centrar la imagen en la pantalla
-        new_image = Image.new("RGBA", (self.screen_width, self.screen_height))
-        new_image.paste(resized_image, (int((self.screen_width - new_width) / 2), int((self.screen_height - new_height) / 2)))
-        return new_image
-
+            return image_index
 
     def load_particle_config(self, screen_size):
         log_message("Cargando configuración de partículas...")
         config_path = os.path.join(self.path, "particles_config.json")
         with open(config_path, 'r') as config_file:
-            self.particle_config = json.load(config_file)
-            properties = self.particle_config["particle_properties"][0]
-            self.particles = [Particle(properties, screen_size) for _ in range(self.particle_config["total_particles"])]
-            self.particle_thread = ParticleUpdateThread(self.particles)
-            self.particle_thread.start()
+            self.particle_config = validate_particle_config(json.load(config_file), self.path)
+            properties = self.particle_config["particle_properties"]
+            self.particles = ParticleSystem(properties, self.particle_config["total_particles"], screen_size,
+                                            rng=np.random.default_rng(self.seed), interactions=self.particle_config.get("interactions"))
+            self.particle_thread = SimulationWorker(self.particles)
 
     def start_particle_thread(self):
-        # Verifica si el hilo existe y está vivo, y detenlo si es necesario
-        if hasattr(self, 'particle_thread') and self.particle_thread.is_alive():
-            self.particle_thread.stop()
-            self.particle_thread.join()
+        # Reanuda el simulador de la carpeta (lo arranca la primera vez)
+        self.particle_thread.resume()
 
-        # Crea y comienza un nuevo hilo
-        self.particle_thread = ParticleUpdateThread(self.particles)
-        self.particle_thread.start()
+    def park_particle_thread(self):
+        # Detiene la simulación sin destruir el hilo, al dejar de mostrar la carpeta
+        self.particle_thread.park()
 
-    
     def stop_particle_thread(self):
-        if hasattr(self, 'particle_thread'):
-            self.particle_thread.stop()
+        self.particle_thread.stop()
 
-    def get_center_image(self):
-        max_scale = 2.0  # Escala máxima de la imagen
+    def draw_particles(self, screen):
+        return self.particles.draw(screen, self.particle_thread.interpolated())
 
+    def preload_center_images(self):
+        frames = center_ladder(self.center_image, self.center_scale, self.max_scale, self.center_scale_step)
+        self.center_images = [to_display_surface(frame) for frame in frames]
+
+    def next_center_position(self):
         # Calcula la escala objetivo en función del volumen (volume_level está normalizado entre 0 y 1)
-        target_scale = 1 + (max_scale - 1) * self.volume_level
+        target_scale = 1 + (self.max_scale - 1) * self.volume_level
 
         # Interpola suavemente entre el tamaño actual y el tamaño objetivo
         scale_change_speed = 0.2  # Velocidad de cambio de escala, ajustar según sea necesario
         self.current_scale_factor += (target_scale - self.current_scale_factor) * scale_change_speed
 
-        # Calcula el nuevo tamaño de la imagen
-        scaled_width = int(self.center_image.width * self.center_scale * self.current_scale_factor)
-        scaled_height = int(self.center_image.height * self.center_scale * self.current_scale_factor)
-        resized = self.center_image.resize((scaled_width, scaled_height), Image.ANTIALIAS)
+        # Posición (fraccionaria) en la escalera de imágenes centrales
+        position = (self.current_scale_factor - 1) / self.center_scale_step
+        return max(0, min(position, len(self.center_images) - 1))
 
-        # Convierte la imagen redimensionada a un formato compatible con pygame
-        return pygame.image.fromstring(resized.tobytes(), resized.size, resized.mode)
+    def center_index(self, position):
+        index = int(round(position))
+        if self.center_quantization > 1:
+            # Con menos calidad se usan solo algunos niveles
+            index = int(round(position / self.center_quantization)) * self.center_quantization
+        # Redondear al múltiplo más cercano puede pasarse del último nivel de la escalera
+        return max(0, min(index, len(self.center_images) - 1))
 
+    def get_center_image(self):
+        position = self.next_center_position()
+        if self.center_quantization > 1 or not self.smooth_center:
+            # Con la escala cuantizada nunca se escala al vuelo
+            return self.center_images[self.center_index(position)]
+
+        # Modo suave: entre dos niveles vecinos hay CENTER_BLEND_STEPS - 1 fundidos de
+        # ambos, sin reescalar nada. Fundir cuesta tanto como un smoothscale, así que
+        # cada fundido se hace una vez y se guarda
+        lower, step = divmod(int(round(position * CENTER_BLEND_STEPS)), CENTER_BLEND_STEPS)
+        if step == 0:
+            return self.center_images[lower]
+        blend = self.center_blends.get((lower, step))
+        if blend is None:
+            blend = self.center_blends[(lower, step)] = self.blend_center_levels(lower, step / CENTER_BLEND_STEPS)
+        return blend
+
+    def blend_center_levels(self, lower, weight):
+        # El nivel superior, con opacidad 'weight', sobre el inferior centrado
+        below, above = self.center_images[lower], self.center_images[lower + 1]
+        blend = pygame.Surface(above.get_size(), pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            blend = blend.convert_alpha()
+        blend.fill((0, 0, 0, 0))
+        blend.blit(below, below.get_rect(center=blend.get_rect().center))
+        above.set_alpha(int(weight * 255))
+        blend.blit(above, (0, 0))
+        above.set_alpha(None)
+        return blend
 
     @staticmethod
     def preload_folders(paths, screen_size):
@@ -276,72 +307,443 @@ class ImageFolder:
         return [ImageFolder(path, screen_size) for path in paths]
 
 class AudioProcessor(threading.Thread):
-    def __init__(self, buffer_size, sample_rate=44100, channels=1):
+    def __init__(self, buffer_size, sample_rate=44100, channels=1, analysis_rate=60, source=None):
         super().__init__()
-        self.sample_rate = sample_rate
+        # Por defecto se captura el micrófono con PyAudio
+        self.source = source or PyAudioSource(sample_rate, channels, buffer_size)
+        self.sample_rate = self.source.sample_rate
         self.channels = channels
         self.buffer_size = buffer_size  # CHUNK en el código original
-        self.p = pyaudio.PyAudio()
+        self.analysis_rate = analysis_rate  # Análisis por segundo
         self.sensitivity = 1.5
-        self.stream = self.p.open(format=pyaudio.paInt16,
-                                  channels=self.channels,
-                                  rate=self.sample_rate,
-                                  input=True,
-                                  frames_per_buffer=self.buffer_size)
+        self.ring_buffer = RingBuffer(self.sample_rate * 2)
+        self.analyzer = AudioAnalyzer(self.sample_rate)
+        self.features = SILENCE
         self.daemon = True
-        self.volume = 0
+        self.running = True
+
+    def callback(self, samples):
+        self.ring_buffer.write(samples)
+
+    def start(self):
+        self.source.start(self.callback)
+        super().start()
 
     def run(self):
-        while True:
-            audio_data = np.frombuffer(self.stream.read(self.buffer_size), dtype=np.int16)
-            self.volume = ((max(abs(audio_data.min()), abs(audio_data.max())) / 32768) * 3) * self.sensitivity 
+        period = 1 / self.analysis_rate
+        next_analysis = time.perf_counter()
+        while self.running:
+            features = self.analyzer.analyze(self.ring_buffer)
+            # Misma escala de volumen que el cálculo original a partir del pico
+            self.features = features._replace(volume=features.peak * 3 * self.sensitivity)
+            next_analysis += period
+            time.sleep(max(0, next_analysis - time.perf_counter()))
+
+    def get_features(self):
+        # Última instantánea publicada; no bloquea
+        return self.features
 
     def get_volume(self):
-        log_message(f"Volumen: {self.volume}")
-        return self.volume
+        log_message("Volumen", logging.DEBUG, rate_key="volume", volume=round(self.features.volume, 3))
+        return self.features.volume
 
     def stop(self):
-        self.stream.stop_stream()
-        self.stream.close()
-        self.p.terminate()
+        self.running = False
+        self.source.stop()
 
 def get_folders_in_directory(directory):
     return [os.path.join(directory, f) for f in os.listdir(directory) if os.path.isdir(os.path.join(directory, f))]
 
 class FolderLoaderManager:
-    def __init__(self, folder_paths, screen_size):
+    def __init__(self, folder_paths, screen_size, memory_budget=DEFAULT_MEMORY_BUDGET, preload_mode="thread", frame_cache=None,
+                 use_bundle=True, smooth_center=False):
         self.folder_paths = folder_paths
         self.screen_size = screen_size
-        self.image_folders = []
+        self.memory_budget = memory_budget  # Bytes; None para no expulsar nunca
+        self.frame_cache = frame_cache
+        self.use_bundle = use_bundle  # False ignora los paquetes de escena y carga desde las imágenes
+        self.smooth_center = smooth_center  # Fundido entre niveles de la imagen central
+        # "thread" genera las rotaciones en el hilo de carga; "process" las reparte entre procesos
+        self.preload_mode = preload_mode
+        self.process_pool = None
+        if preload_mode == "process":
+            # SDL y los hilos de este proceso no sobreviven a un fork: los procesos arrancan desde cero
+            self.process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=get_max_workers(),
+                                                                       mp_context=multiprocessing.get_context("spawn"))
+        self.image_folders = collections.OrderedDict()  # Carpetas residentes en orden LRU
+        self.pending = {}  # Carpetas que se están cargando en segundo plano
+        self.lock = threading.RLock()
+        # Avisa cuando una pre-carga sale de 'pending', admitida o descartada
+        self.admitted = threading.Condition(self.lock)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        # Los paquetes de escena se recompilan en un proceso aparte de baja prioridad (unos 10 s
+        # cada uno) para no quitar al cargador los hilos de las pre-cargas
+        lower_priority = hasattr(os, "nice")
+        self.rebuild_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=os.nice if lower_priority else None,
+            initargs=(REBUILD_NICENESS,) if lower_priority else ())
+        self.rebuilds = {}  # Ruta -> recompilación de su paquete en curso
+        self.closed = False
         self.current_folder_index = 0  # Índice de la carpeta actual
+        # Cambios en disco (altas, bajas y recargas terminadas) que se aplican entre fotogramas
+        self.updates = collections.deque()
+        self.generations = {}  # Ruta -> versión de los ficheros; descarta cargas de una versión anterior
+        self.retired = set()  # Carpetas eliminadas que siguen en pantalla hasta la próxima transición
+        self.transition_target = None  # Carpeta entrante de la transición en curso
 
     def load_folders(self):
-        max_workers = get_max_workers()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.load_folder, path) for path in self.folder_paths]
-            for future in concurrent.futures.as_completed(futures):
-                folder = future.result()
-                self.image_folders.append(folder)
+        # No bloquea: la carpeta actual se carga en segundo plano y start_current_folder()
+        # la entrega cuando está lista; la siguiente se pre-carga después
+        if self.folder_paths:
+            self.prefetch(self.folder_paths[self.current_folder_index])
+
+    def start_current_folder(self):
+        # La carpeta actual ya arrancada si ha terminado de cargar, o None sin esperar.
+        # Si su carga ha fallado se quita de la rotación y se empieza con la siguiente
+        if not self.folder_paths:
+            return None
+        folder_path = self.folder_paths[self.current_folder_index]
+        with self.lock:
+            folder = self.image_folders.get(folder_path)
+            loading = folder_path in self.pending
+        if folder is None:
+            if not loading:
+                self.folder_paths.remove(folder_path)
+                if self.folder_paths:
+                    self.current_folder_index %= len(self.folder_paths)
+                    self.prefetch(self.folder_paths[self.current_folder_index])
+            return None
+        folder.start_particle_thread()
+        self.prefetch_next_folder()
+        return folder
+
+    def current_folder_path(self):
+        return self.folder_paths[self.current_folder_index] if self.folder_paths else None
 
     def load_folder(self, folder_path):
-        folder = ImageFolder(folder_path, self.screen_size)
+        with self.lock:
+            rebuild = self.rebuilds.get(folder_path)
+        if rebuild is not None:
+            # Esperar al paquete nuevo es más rápido que cargar desde las imágenes
+            concurrent.futures.wait([rebuild])
+        folder = ImageFolder(folder_path, self.screen_size, self.frame_cache, self.process_pool, smooth_center=self.smooth_center,
+                             use_bundle=self.use_bundle)
         return folder
 
+    def get_folder(self, folder_path):
+        with self.lock:
+            folder = self.image_folders.get(folder_path)
+            if folder is not None:
+                self.image_folders.move_to_end(folder_path)
+                return folder
+            future = self.pending.get(folder_path)
+            if future is not None:
+                log_message(f"Esperando a que termine la pre-carga de [{folder_path}]", logging.WARNING)
+                # El resultado del future llega antes que prefetch_done: se espera a que la
+                # carpeta se admita o se descarte
+                self.admitted.wait_for(lambda: self.pending.get(folder_path) is not future)
+                folder = self.image_folders.get(folder_path)
+                if folder is not None:
+                    self.image_folders.move_to_end(folder_path)
+                    return folder
+
+        # Sin pre-carga, o la pre-carga falló o quedó obsoleta: se carga aquí
+        try:
+            folder = self.load_folder(folder_path)
+        except (OSError, ValueError, pygame.error) as e:
+            log_message(f"Error cargando [{folder_path}]: {e}", logging.ERROR)
+            self.updates.append(("retire", folder_path, None))
+            return None
+        self.admit_folder(folder_path, folder)
+        with self.lock:
+            return self.image_folders.get(folder_path)
+
+    def prefetch(self, folder_path):
+        with self.lock:
+            if folder_path in self.image_folders or folder_path in self.pending:
+                return
+            generation = self.generations.get(folder_path, 0)
+            future = self.executor.submit(self.load_folder, folder_path)
+            self.pending[folder_path] = future
+        future.add_done_callback(lambda f: self.prefetch_done(folder_path, f, generation))
+
+    def prefetch_done(self, folder_path, future, generation=0):
+        try:
+            self.finish_prefetch(folder_path, future, generation)
+        finally:
+            with self.lock:
+                if self.pending.get(folder_path) is future:
+                    del self.pending[folder_path]
+                self.admitted.notify_all()
+
+    def finish_prefetch(self, folder_path, future, generation):
+        if future.cancelled():
+            with self.lock:
+                self.pending.pop(folder_path, None)
+            return
+        if future.exception() is not None:
+            # Al cerrar, la pantalla puede desaparecer en mitad de una pre-carga
+            if not self.closed:
+                log_message(f"Error pre-cargando [{folder_path}]: {future.exception()}", logging.ERROR)
+                # Una carpeta que no carga bloquearía las transiciones; vuelve cuando se modifique
+                self.updates.append(("retire", folder_path, None))
+            with self.lock:
+                self.pending.pop(folder_path, None)
+            return
+        with self.lock:
+            stale = self.generations.get(folder_path, 0) != generation
+            if stale:
+                # Los ficheros cambiaron durante la carga; la recarga ya está en marcha
+                self.pending.pop(folder_path, None)
+        if stale:
+            future.result().stop_particle_thread()
+            return
+        self.admit_folder(folder_path, future.result())
+
+    def prefetch_next_folder(self):
+        if self.folder_paths:
+            self.prefetch(self.folder_paths[self.get_next_folder_index()])
+
+    def admit_folder(self, folder_path, folder):
+        with self.lock:
+            if self.closed:
+                # Pre-carga terminada después de cerrar el gestor
+                folder.stop_particle_thread()
+                return
+            self.image_folders[folder_path] = folder
+            self.pending.pop(folder_path, None)
+            log_message(f"Carpeta residente [{folder_path}]: {format_bytes(folder.memory_usage())}")
+            self.enforce_memory_budget()
+        if self.use_bundle and not folder.from_bundle and os.path.exists(bundle_path(folder_path)):
+            # Paquete obsoleto o no válido: la próxima carga ya no pasará por las imágenes
+            self.rebuild_bundle(folder_path)
+
+    def folders_changed(self, added, changed, removed):
+        # Llamado desde el vigilante: recompone en segundo plano las carpetas cargadas
+        # que han cambiado; las altas y bajas se aplican entre fotogramas
+        for folder_path in added:
+            self.updates.append(("add", folder_path, None))
+        for folder_path in changed:
+            if folder_path in self.folder_paths:
+                self.reload_folder(folder_path)
+            else:
+                # Carpeta retirada por un error que quizá ya esté corregido
+                self.updates.append(("add", folder_path, None))
+        for folder_path in removed:
+            self.updates.append(("remove", folder_path, None))
+
+    def reload_folder(self, folder_path):
+        with self.lock:
+            if self.closed:
+                return
+            generation = self.generations[folder_path] = self.generations.get(folder_path, 0) + 1
+            loaded = folder_path in self.image_folders or folder_path in self.pending
+        if self.use_bundle and os.path.exists(bundle_path(folder_path)):
+            # Primero se recompila el paquete, también sin cargar la carpeta; si está cargada,
+            # después se sustituye por la versión del paquete nuevo
+            self.rebuild_bundle(folder_path, generation if loaded else None)
+        elif loaded:
+            # Sin paquete y sin cargar no hay nada que hacer: cuando toque se leerán los ficheros nuevos
+            future = self.executor.submit(self.load_folder, folder_path)
+            future.add_done_callback(lambda f: self.reload_done(folder_path, generation, f))
+
+    def rebuild_bundle(self, folder_path, generation=None):
+        # 'generation' es la versión de la carpeta cargada que hay que sustituir al terminar, o None
+        with self.lock:
+            if self.closed or (generation is None and folder_path in self.rebuilds):
+                return
+            future = self.rebuild_pool.submit(build_bundle, folder_path, scene_settings(self.screen_size, DEFAULT_CENTER_SCALE_STEP))
+            self.rebuilds[folder_path] = future
+        log_message(f"Recompilando paquete de escena [{folder_path}]")
+        future.add_done_callback(lambda f: self.rebuild_done(folder_path, generation, f))
+
+    def rebuild_done(self, folder_path, generation, future):
+        with self.lock:
+            if self.rebuilds.get(folder_path) is future:
+                del self.rebuilds[folder_path]
+            if self.closed or future.cancelled():
+                return
+            # Si los ficheros han vuelto a cambiar, ya hay otra recompilación en cola
+            current = generation is not None and self.generations.get(folder_path, 0) == generation
+        if future.exception() is not None:
+            log_message(f"Error recompilando el paquete de escena [{folder_path}]: {future.exception()}", logging.ERROR)
+        else:
+            log_message(f"Paquete de escena recompilado [{folder_path}]")
+        if current:
+            # Sin paquete nuevo la carpeta se carga desde las imágenes, o falla y se mantiene la anterior
+            load = self.executor.submit(self.load_folder, folder_path)
+            load.add_done_callback(lambda f: self.reload_done(folder_path, generation, f))
+
+    def reload_done(self, folder_path, generation, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if not self.closed:
+                log_message(f"Error recargando [{folder_path}], se mantiene la versión anterior: {future.exception()}", logging.ERROR)
+            return
+        self.updates.append(("swap", folder_path, (generation, future.result())))
+
+    def apply_updates(self):
+        # Aplica en el hilo principal, entre fotogramas, los cambios pendientes.
+        # Devuelve True si la carpeta en pantalla ha sido sustituida.
+        if not self.updates:
+            return False
+        current_path = self.folder_paths[self.current_folder_index] if self.folder_paths else None
+        current_replaced = False
+        while self.updates:
+            action, folder_path, data = self.updates.popleft()
+            if action == "add":
+                self.retired.discard(folder_path)
+                if folder_path not in self.folder_paths:
+                    self.folder_paths.append(folder_path)
+                    log_message(f"Carpeta añadida [{folder_path}]")
+            elif action in ("remove", "retire"):
+                if folder_path in (current_path, self.transition_target):
+                    self.retired.add(folder_path)
+                elif folder_path in self.folder_paths:
+                    self.folder_paths.remove(folder_path)
+                    # Liberar cientos de MB de superficies lleva su tiempo: fuera del bucle
+                    self.executor.submit(self.evict_folder, folder_path)
+                    log_message(f"Carpeta retirada de la rotación [{folder_path}]")
+            elif action == "swap":
+                current_replaced |= self.swap_folder(folder_path, *data) and folder_path == current_path
+        if current_path in self.folder_paths:
+            self.current_folder_index = self.folder_paths.index(current_path)
+        self.prefetch_next_folder()
+        return current_replaced
+
+    def swap_folder(self, folder_path, generation, folder):
+        with self.lock:
+            if self.generations.get(folder_path, 0) != generation or folder_path not in self.folder_paths:
+                previous = None
+                stale = True
+            else:
+                stale = False
+                previous = self.image_folders.get(folder_path)
+                # La asignación conserva la posición de la carpeta en el orden LRU
+                self.image_folders[folder_path] = folder
+                self.pending.pop(folder_path, None)
+        if stale:
+            folder.stop_particle_thread()
+            return False
+        if previous is not None:
+            previous.park_particle_thread()
+            # stop() espera al hilo; se hace fuera del bucle de render
+            self.executor.submit(previous.stop_particle_thread)
+            if self.folder_paths[self.current_folder_index] == folder_path:
+                folder.start_particle_thread()
+        log_message(f"Carpeta recargada [{folder_path}]: {format_bytes(folder.memory_usage())}")
+        self.enforce_memory_budget()
+        return True
+
+    def pinned_paths(self):
+        # La carpeta actual y la que elegirá next_folder() nunca se expulsan
+        if not self.folder_paths:
+            return set()
+        pinned = {self.folder_paths[self.current_folder_index], self.folder_paths[self.get_next_folder_index()]}
+        if self.transition_target is not None:
+            pinned.add(self.transition_target)
+        return pinned
+
+    def enforce_memory_budget(self):
+        if self.memory_budget is None:
+            return
+        with self.lock:
+            pinned = self.pinned_paths()
+            for folder_path in list(self.image_folders):
+                if self.memory_usage() <= self.memory_budget:
+                    break
+                if folder_path not in pinned:
+                    self.evict_folder(folder_path)
+            if self.memory_usage() > self.memory_budget:
+                log_message(f"Presupuesto de memoria superado: {format_bytes(self.memory_usage())} de {format_bytes(self.memory_budget)}",
+                            logging.WARNING, rate_key="memory_budget", rate_interval=10.0)
+
+    def evict_folder(self, folder_path):
+        with self.lock:
+            folder = self.image_folders.pop(folder_path, None)
+        if folder is not None:
+            folder.stop_particle_thread()
+            log_message(f"Carpeta expulsada [{folder_path}]: {format_bytes(folder.memory_usage())} liberados")
+
+    def memory_usage(self):
+        with self.lock:
+            return sum(folder.memory_usage() for folder in self.image_folders.values())
+
+    def memory_report(self):
+        # Uso de memoria por carpeta residente
+        with self.lock:
+            return {path: folder.memory_usage() for path, folder in self.image_folders.items()}
+
     def get_current_folder(self):
         # Devuelve la carpeta actualmente seleccionada
-        if self.image_folders:
-            return self.image_folders[self.current_folder_index]
+        if self.folder_paths:
+            return self.get_folder(self.folder_paths[self.current_folder_index])
         return None
 
+    def get_next_folder_index(self):
+        return (self.current_folder_index + 1) % len(self.folder_paths)
+
+    def get_next_folder(self):
+        # La siguiente carpeta si ya está residente, sin esperar a que se cargue
+        if not self.folder_paths:
+            return None
+        with self.lock:
+            return self.image_folders.get(self.folder_paths[self.get_next_folder_index()])
+
+    def start_transition(self):
+        # La carpeta entrante queda fijada hasta el cambio: las altas y bajas que lleguen
+        # durante la transición ya no cambian a qué carpeta se pasa
+        folder = self.get_next_folder()
+        if folder is not None:
+            self.transition_target = folder.path
+        return folder
+
     def next_folder(self):
-        # Cambia a la siguiente carpeta
-        if self.image_folders:
-            self.current_folder_index = (self.current_folder_index + 1) % len(self.image_folders)
+        # Cambia a la carpeta entrante de la transición, o a la siguiente si no la hay
+        target, self.transition_target = self.transition_target, None
+        if target in self.folder_paths:
+            self.set_folder(self.folder_paths.index(target))
+        elif self.folder_paths:
+            self.set_folder(self.get_next_folder_index())
 
     def set_folder(self, index):
         # Establece la carpeta actual por índice
-        if self.image_folders and 0 <= index < len(self.image_folders):
+        if self.folder_paths and 0 <= index < len(self.folder_paths):
+            with self.lock:
+                previous = self.image_folders.get(self.folder_paths[self.current_folder_index])
+            previous_index = self.current_folder_index
             self.current_folder_index = index
+            folder = self.get_current_folder()
+            if folder is None:
+                # No se ha podido cargar: se sigue con la carpeta en pantalla
+                self.current_folder_index = previous_index
+                return
+            # Solo simula la carpeta visible
+            if previous is not None and previous is not folder:
+                previous.park_particle_thread()
+            folder.start_particle_thread()
+            # Las carpetas eliminadas mientras estaban en pantalla salen ahora de la rotación
+            for retired_path in list(self.retired):
+                if retired_path != folder.path:
+                    self.retired.discard(retired_path)
+                    if retired_path in self.folder_paths:
+                        self.folder_paths.remove(retired_path)
+                        self.executor.submit(self.evict_folder, retired_path)
+            self.current_folder_index = self.folder_paths.index(folder.path)
+            self.prefetch_next_folder()
+            self.enforce_memory_budget()
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.rebuild_pool.shutdown(wait=False, cancel_futures=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            for folder in self.image_folders.values():
+                folder.stop_particle_thread()
 
 class FolderLoaderThread(threading.Thread):
     def __init__(self, folder_path, screen_size, image_folders):
@@ -356,45 +758,32 @@ class FolderLoaderThread(threading.Thread):
         self.image_folders.append(folder)
 
 
-class ParticleUpdateThread(threading.Thread):
-    def __init__(self, particles):
-        super().__init__()
-        self.particles = particles
-        self.running = True
-
-    def run(self):
-        while self.running:
-            time.sleep(0.02)
-            for particle in self.particles:
-                particle.update()
-
-    def stop(self):
-        self.running = False
-
-
-def log_message(message):
-    console_tag = "\033[32m[@Console]\033[0m"
-    formatted_message = f"{console_tag} {message}"
-    print(formatted_message)
+def format_bytes(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
 
 
 def get_max_workers():
     """Get the maximum number of threads that can be used for concurrent tasks."""
     return os.cpu_count() or 1
 
-def performance_test(image_path, max_file_size, max_resolution):
-    image = Image.open(image_path)
-    file_size = os.path.getsize(image_path)
-    resolution = image.size[0] * image.size[1]
+def log_memory_report(manager):
+    # Memoria de cada carpeta residente frente al presupuesto
+    report = manager.memory_report()
+    budget = "sin límite" if manager.memory_budget is None else format_bytes(manager.memory_budget)
+    log_message(f"Memoria de carpetas: {format_bytes(sum(report.values()))} de {budget}",
+                **{os.path.basename(path): format_bytes(size) for path, size in report.items()})
 
-    if file_size > max_file_size or resolution > max_resolution:
-        factor = max(file_size / max_file_size, resolution / max_resolution)
-        new_size = (int(image.size[0] / factor**0.5), int(image.size[1] / factor**0.5))
-        image = image.resize(new_size, Image.ANTIALIAS)
 
-    return image
+def apply_audio_features(folder, features):
+    folder.update_volume_level(features.volume)
+    if features.beat:
+        folder.update_rotation_pause(True)
+        folder.update_particle_attraction()
+    folder.update_particle_size(features.volume)
 
-def main():
+
+def main(audio_source=None, instrument=True, transition_name="lightning", target_fps=30, quality="auto", watch=True,
+         exit_after_first_frame=False, effects=(), frame_sink=None, preload_mode="thread", smooth_center=False):
     log_message("Inicializando programa...")
     
     screen_width, screen_height = 800, 600
@@ -404,101 +793,201 @@ def main():
         log_message("No se encontraron carpetas de imágenes.")
         return
 
-    manager = FolderLoaderManager(folder_paths, (screen_width, screen_height))
-    manager.load_folders()
-    
-    log_message("Pre-cargando los truenos...")
-    lightning_manager = LightningManager(screen_width, screen_height, 7)
-    lightning_manager.precalculate_lightnings()
-    lightning = lightning_manager.get_random_lightning()
-
-    image_folders = manager.image_folders
-
     log_message("Iniciando Pygame...")
     pygame.init()
     screen = pygame.display.set_mode((screen_width, screen_height), pygame.DOUBLEBUF | pygame.HWSURFACE)
     pygame.display.set_caption('Image Viewer')
     font = pygame.font.Font(None, 36)
     log_message("Pygame iniciado.")
-    
-    current_folder_index = 0
-    folder = image_folders[current_folder_index]
 
-    log_message("Iniciando bucle principal...")
+    # Lo primero que se ve es la pantalla de carga; las carpetas llegan después
+    loading = LoadingScene(screen, font)
+    loading.draw("Cargando...")
+    pygame.display.flip()
+    startup = {"loading_screen": time.perf_counter() - PROCESS_START}
+    log_message(f"Pantalla de carga en {startup['loading_screen'] * 1000:.0f} ms")
+
+    # La pantalla se abre antes de cargar para convertir los fotogramas a su formato
+    manager = FolderLoaderManager(folder_paths, (screen_width, screen_height), preload_mode=preload_mode,
+                                  smooth_center=smooth_center)
+    manager.load_folders()
     
-    audio_processor = AudioProcessor(buffer_size=5)
+    # Los relámpagos se generan en segundo plano mientras se muestra la primera carpeta
+    lightning_manager = LightningManager(screen_width, screen_height, 7)
+    lightning_manager.start()
+
+    # Cambios en las carpetas de imágenes sin reiniciar
+    watcher = FolderWatcher("images", manager.folders_changed) if watch else None
+    if watcher is not None:
+        watcher.start()
+
+    audio_processor = AudioProcessor(buffer_size=512, source=audio_source)
     audio_processor.start()
-    
-    
+
+    # Salida de fotogramas para otros procesos (muros LED, otro proyector)
+    sink = None
+    if frame_sink is not None:
+        try:
+            sink = FrameSink(screen.get_size(), name=frame_sink)
+            log_message(f"Publicando fotogramas en memoria compartida [{sink.name}]")
+        except FileExistsError:
+            log_message(f"Ya existe el bloque de memoria compartida [{frame_sink}]; sin salida de fotogramas",
+                        logging.ERROR)
+
+    def shutdown():
+        if sink is not None:
+            sink.close()
+        if watcher is not None:
+            watcher.stop()
+        manager.shutdown()
+        lightning_manager.stop()
+        audio_processor.stop()
+        pygame.quit()
+
+    # La primera carpeta se puede mostrar en cuanto están sus recursos, sin esperar a las demás
     clock = pygame.time.Clock()
-    showing_lightning = False
-    lightning_count = 0
+    folder = manager.start_current_folder()
+    while folder is None:
+        clock.tick(target_fps)
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            shutdown()
+            return
+        folder = manager.start_current_folder()
+        if folder is None:
+            current_path = manager.current_folder_path()
+            loading.draw(f"Cargando {os.path.basename(current_path)}..." if current_path else "No hay carpetas que mostrar")
+            pygame.display.flip()
+
+    log_message("Iniciando bucle principal...")
+    
+    # Sin instrumentación, el compositor recibe None y no mide nada
+    instrumentation = Instrumentation() if instrument else None
+    hud = Hud(instrumentation or Instrumentation(), font)
+    compositor = Compositor(screen, instrumentation)
+    if quality == "auto":
+        governor = QualityGovernor(target_fps)
+    else:
+        governor = QualityGovernor(target_fps, level=get_quality_level(quality), adaptive=False)
+    # Efectos de píxel sobre el fotograma compuesto, controlados por el audio
+    effects_pipeline = EffectsPipeline(screen.get_size(), effects) if effects else None
+    compositor.effects = effects_pipeline
+    compositor.frame_sink = sink
+    compositor.apply_quality(governor.level)
+    folder.apply_quality(governor.level)
+    log_message(f"Calidad: {governor.report()}")
+    last_gauge_update = 0
+    last_memory_report = pygame.time.get_ticks()
+
     time_since_last_change = 0
-    transition_start = False
-    transition_phase = 0
     transition_time = 5000  # 5 segundos
+    transition = create_transition(transition_name, screen, lightning_manager)
+    incoming_frame = pygame.Surface(screen.get_size()) if transition.needs_incoming_frame else None
+    # El fotograma entrante del fundido se compone igual que la pantalla, sin presentarlo
+    incoming_compositor = None
+    if incoming_frame is not None:
+        incoming_compositor = Compositor(incoming_frame)
+        incoming_compositor.effects = effects_pipeline
+        incoming_compositor.apply_quality(governor.level)
     while True:
         
-        dt = clock.tick(30)  # 30 FPS, 'dt' es el tiempo transcurrido en milisegundos
+        dt = clock.tick(target_fps)  # 'dt' es el tiempo transcurrido en milisegundos
+        frame_start = time.perf_counter()
         time_since_last_change += dt
         
-        if time_since_last_change >= transition_time and not transition_start:
-            transition_start = True
-            transition_phase = 1
-            lightning_count = 0
-
-        if transition_start:
-            if transition_phase == 1 and lightning_count < 3:
-                # lightning = lightning_manager.get_random_lightning()
-                # lightning.draw(screen)
-                # pygame.display.flip()
-                # pygame.time.wait(300)
-                screen.fill((255, 255, 255))
-                lightning_count += 1
-                if lightning_count == 3:
-                    transition_phase = 2
-
-            elif transition_phase == 2:
-                screen.fill((255, 255, 255))
-                # pygame.display.flip()
-                # pygame.time.wait(300)
-                manager.next_folder()
-                folder = manager.get_current_folder()
-                transition_start = False
-                time_since_last_change = 0
+        # La transición solo empieza con la siguiente carpeta ya cargada
+        if time_since_last_change >= transition_time and not transition.active:
+            next_folder = manager.start_transition()
+            if next_folder is not None:
+                next_folder.apply_quality(governor.level)
+                if incoming_compositor is not None:
+                    incoming_compositor.draw_folder(next_folder, full=True)
+                transition.start(incoming_frame)
+        # Carpetas recargadas desde disco: se sustituyen aquí, entre dos fotogramas
+        if manager.apply_updates():
+            folder = manager.get_current_folder()
+            folder.apply_quality(governor.level)
+            compositor.invalidate()
+        if transition.update():
+            manager.next_folder()
+            folder = manager.get_current_folder()
+            folder.apply_quality(governor.level)
+            time_since_last_change = 0
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                folder.stop_particle_thread()
-                pygame.quit()
+                shutdown()
                 return
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_p:
                     pygame.display.toggle_fullscreen()
+                    compositor.invalidate()
+                elif event.key == pygame.K_h:
+                    hud.toggle()
                 elif event.key == pygame.K_MINUS and (pygame.key.get_mods() & pygame.KMOD_CTRL):
                     audio_processor.sensitivity -= 0.1
                 elif event.key == pygame.K_EQUALS and (pygame.key.get_mods() & pygame.KMOD_CTRL):
                     audio_processor.sensitivity += 0.1
 
                 
-        screen.fill((0, 0, 0))
-        volume_level = audio_processor.get_volume()
-        folder.update_volume_level(volume_level)
-        folder.update_particle_size(volume_level)
-        folder.start_particle_thread()
-        bg_img = folder.get_background_image()
-        center_img = folder.get_center_image()
-        screen.blit(bg_img, bg_img.get_rect(center=(screen_width // 2, screen_height // 2)))
-        screen.blit(center_img, center_img.get_rect(center=(screen_width // 2, screen_height // 2)))
-
-        # Dibujar partículas
-        for particle in folder.particles:
-            particle.draw(screen)
-
-        fps_text = font.render(f"FPS: {clock.get_fps():.2f}", True, pygame.Color('white'))
-        screen.blit(fps_text, fps_text.get_rect(bottomright=(screen_width - 10, screen_height - 10)))
-
-        pygame.display.flip()
-        clock.tick(30)
+        features = audio_processor.get_features()
+        apply_audio_features(folder, features)
+        if effects_pipeline is not None:
+            effects_pipeline.update(features)
+        # Durante una transición se repinta todo: su capa cubre la pantalla entera
+        compositor.compose(folder, (transition.draw, lambda surface: hud.draw(surface, clock.get_fps())),
+                           full=transition.active)
+        if "first_frame" not in startup:
+            startup["first_frame"] = time.perf_counter() - PROCESS_START
+            log_message(f"Primer fotograma en {startup['first_frame'] * 1000:.0f} ms")
+            if instrumentation is not None:
+                instrumentation.set_gauge("primer fotograma", f"{startup['first_frame'] * 1000:.0f} ms")
+            if exit_after_first_frame:
+                shutdown()
+                return startup
+
+        if instrumentation is not None and pygame.time.get_ticks() - last_gauge_update >= 1000:
+            last_gauge_update = pygame.time.get_ticks()
+            instrumentation.set_gauge("carpetas", format_bytes(manager.memory_usage()))
+            instrumentation.set_gauge("carpeta", os.path.basename(folder.path))
+            instrumentation.set_gauge("área actualizada", f"{compositor.updated_area:.0%}")
+            instrumentation.set_gauge("calidad", governor.level.name)
+
+        if pygame.time.get_ticks() - last_memory_report >= MEMORY_REPORT_INTERVAL:
+            last_memory_report = pygame.time.get_ticks()
+            log_memory_report(manager)
+
+        # Solo cuenta el trabajo del fotograma, no la espera de clock.tick
+        if governor.record(time.perf_counter() - frame_start):
+            folder.apply_quality(governor.level)
+            compositor.apply_quality(governor.level)
+            if incoming_compositor is not None:
+                incoming_compositor.apply_quality(governor.level)
+            log_message(f"Calidad: {governor.report()}")
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Visualizador de imágenes reactivo al audio")
+    parser.add_argument("--audio", default="pyaudio", choices=["pyaudio", "sounddevice", "wav", "synthetic"],
+                        help="Fuente de audio")
+    parser.add_argument("--wav", help="Fichero WAV para la fuente 'wav'")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--transition", default="lightning", choices=sorted(TRANSITIONS),
+                        help="Transición entre carpetas")
+    parser.add_argument("--fps", type=int, default=30, help="FPS objetivo")
+    parser.add_argument("--quality", default="auto", choices=["auto"] + [level.name for level in QUALITY_LEVELS],
+                        help="Nivel de calidad fijo, o 'auto' para ajustarlo a los FPS objetivo")
+    parser.add_argument("--no-watch", action="store_true", help="No vigila los cambios en images/")
+    parser.add_argument("--preload-mode", default="thread", choices=["thread", "process"],
+                        help="Dónde se generan las rotaciones de las carpetas sin paquete ni caché: en el hilo de carga "
+                             "o repartidas entre procesos")
+    parser.add_argument("--no-instrumentation", action="store_true", help="Desactiva los contadores por etapa")
+    parser.add_argument("--smooth-center", action="store_true",
+                        help="Funde los dos niveles vecinos de la imagen central en lugar de saltar al más cercano")
+    parser.add_argument("--effects", nargs="*", choices=EFFECTS,
+                        help="Activa efectos de píxel; sin valores, todos")
+    parser.add_argument("--frame-sink", nargs="?", const=DEFAULT_FRAME_SINK, metavar="NOMBRE",
+                        help=f"Publica los fotogramas en memoria compartida (por defecto '{DEFAULT_FRAME_SINK}')")
+    args = parser.parse_args()
+    configure_logging(getattr(logging, args.log_level))
+    main(create_audio_source(args.audio, wav_path=args.wav, block_size=512), instrument=not args.no_instrumentation,
+         transition_name=args.transition, target_fps=args.fps, quality=args.quality,
+         watch=not args.no_watch, effects=selected_effects(args.effects), frame_sink=args.frame_sink,
+         preload_mode=args.preload_mode, smooth_center=args.smooth_center)
\ No newline at end of file
@@ -0,0 +1,395 @@
+import collections
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pygame
+
+from interactions import ParticleInteractions, validate_interactions
+from logger import log_message
+from rotation import validate_rotation
+
+# Sistema de partículas en forma de estructura de arrays: cada propiedad es un
+# array de NumPy y las actualizaciones se hacen de una vez para todas las
+# partículas. Usa el mismo formato de particles_config.json que antes; cada
+# entrada de particle_properties es un grupo de partículas.
+
+# Colores distintos por grupo cuando la configuración pide "random"
+RANDOM_PALETTE_SIZE = 8
+ATLAS_MAX_WIDTH = 2048
+# Con más partículas, draw() devuelve un único rectángulo que las cubre a todas:
+# restaurar el fondo bajo miles de rectángulos sueltos cuesta más que bajo uno grande
+MAX_DIRTY_RECTS = 64
+
+
+class SpriteAtlas:
+    # Todos los sprites pre-escalados (uno por grupo, color y tamaño entero) en una
+    # única superficie, para dibujar la capa entera con un solo Surface.blits
+
+    def __init__(self):
+        self.sprites = {}  # (grupo, color, tamaño) -> índice del sprite
+        self.images = []
+        self.offsets = []  # Desplazamiento del sprite respecto a la posición de la partícula
+        self.rects = []
+        self.surface = None
+
+    def add(self, key, image, offset):
+        self.sprites[key] = len(self.images)
+        self.images.append(image)
+        self.offsets.append(offset)
+
+    def build(self):
+        # Empaquetado por filas ordenando por altura
+        order = sorted(range(len(self.images)), key=lambda i: -self.images[i].get_height())
+        self.rects = [None] * len(self.images)
+        x = y = row_height = width = 0
+        for i in order:
+            image_width, image_height = self.images[i].get_size()
+            if x and x + image_width > ATLAS_MAX_WIDTH:
+                x, y = 0, y + row_height
+                row_height = 0
+            self.rects[i] = pygame.Rect(x, y, image_width, image_height)
+            x += image_width
+            width = max(width, x)
+            row_height = max(row_height, image_height)
+
+        self.surface = pygame.Surface((max(1, width), max(1, y + row_height)), pygame.SRCALPHA)
+        for image, rect in zip(self.images, self.rects):
+            self.surface.blit(image, rect)
+        self.surface = self.keyed_surface() or self.surface
+        if pygame.display.get_surface() is not None and self.surface.get_flags() & pygame.SRCALPHA:
+            self.surface = self.surface.convert_alpha()
+        self.images = []
+        offsets = np.asarray(self.offsets, dtype=np.int32).reshape(-1, 2)
+        self.offset_x, self.offset_y = offsets[:, 0], offsets[:, 1]
+        sizes = np.asarray([rect.size for rect in self.rects], dtype=np.int32).reshape(-1, 2)
+        self.width, self.height = sizes[:, 0], sizes[:, 1]
+
+    def keyed_surface(self):
+        # Los círculos (y las imágenes sin semitransparencias) solo tienen píxeles opacos o
+        # vacíos: con un color clave en lugar de alfa por píxel, blits tarda la mitad y el
+        # resultado es el mismo. None si algún sprite necesita el alfa
+        alpha = pygame.surfarray.pixels_alpha(self.surface)
+        opaque = alpha == 255
+        binary = bool(np.all(opaque | (alpha == 0)))
+        del alpha
+        if not binary:
+            return None
+        rgb = pygame.surfarray.array3d(self.surface).astype(np.int64)
+        used = np.unique((rgb[..., 0] << 16 | rgb[..., 1] << 8 | rgb[..., 2])[opaque])
+        # El menor color que no usa ningún sprite
+        key = int(np.setdiff1d(np.arange(len(used) + 1), used)[0])
+        key = ((key >> 16) & 0xFF, (key >> 8) & 0xFF, key & 0xFF)
+        keyed = pygame.Surface(self.surface.get_size())
+        if pygame.display.get_surface() is not None:
+            keyed = keyed.convert()
+        keyed.fill(key)
+        keyed.blit(self.surface, (0, 0))
+        keyed.set_colorkey(key)
+        return keyed
+
+    def memory_usage(self):
+        if self.surface is None:
+            return 0
+        return self.surface.get_bytesize() * self.surface.get_width() * self.surface.get_height()
+
+
+def validate_particle_config(config, folder_path):
+    # Comprueba particles_config.json y devuelve una copia normalizada: siempre una
+    # lista de grupos y rutas 'src' resueltas respecto a la carpeta, para que no
+    # dependan del directorio desde el que se lanza el programa
+    def invalid(message):
+        return ValueError(f"particles_config.json de [{folder_path}]: {message}")
+
+    if not isinstance(config, dict):
+        raise invalid("se esperaba un objeto")
+    total = config.get("total_particles")
+    if not isinstance(total, int) or isinstance(total, bool) or total < 0:
+        raise invalid("'total_particles' debe ser un entero no negativo")
+    groups = config.get("particle_properties")
+    if isinstance(groups, dict):
+        groups = [groups]
+    if not isinstance(groups, list) or not groups:
+        raise invalid("'particle_properties' debe ser un objeto o una lista no vacía")
+
+    normalized = []
+    for i, group in enumerate(groups):
+        if not isinstance(group, dict):
+            raise invalid(f"el grupo {i} debe ser un objeto")
+        size_min, size_max = group.get("size_min"), group.get("size_max")
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in (size_min, size_max)) or not 1 <= size_min <= size_max:
+            raise invalid(f"el grupo {i} necesita 1 <= size_min <= size_max enteros")
+        velocity = group.get("velocity_range")
+        if (not isinstance(velocity, (list, tuple)) or len(velocity) != 2
+                or not all(isinstance(v, (int, float)) for v in velocity) or velocity[0] > velocity[1]):
+            raise invalid(f"el grupo {i} necesita 'velocity_range' [mínimo, máximo]")
+        color = group.get("color")
+        if color != "random" and (not isinstance(color, (list, tuple)) or len(color) != 3
+                                  or not all(isinstance(c, int) and 0 <= c <= 255 for c in color)):
+            raise invalid(f"el grupo {i} necesita 'color' RGB o \"random\"")
+
+        group = dict(group, velocity_range=list(velocity), color=color if color == "random" else list(color))
+        if "src" in group:
+            group["src"] = resolve_sprite_path(group["src"], folder_path)
+            if group["src"] is None:
+                log_message(f"Sprite del grupo {i} no encontrado en [{folder_path}], se dibujarán círculos", logging.WARNING)
+        normalized.append(group)
+    if "interactions" in config:
+        validate_interactions(config["interactions"], invalid)
+    rotation = validate_rotation(config.get("rotation", {}), invalid)
+    return dict(config, particle_properties=normalized, rotation=rotation)
+
+
+def resolve_sprite_path(src, folder_path):
+    # Primero junto a la configuración; después la ruta tal cual, como antes
+    if not isinstance(src, str):
+        return None
+    for candidate in (os.path.join(folder_path, os.path.basename(src)), src):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+class ParticleSystem:
+    def __init__(self, particle_properties, total_particles, screen_size, rng=None, sprite_variants=None, interactions=None):
+        self.rng = rng or np.random.default_rng()
+        # Sprites ya escalados por grupo (uno por tamaño), p. ej. desde un paquete de escena
+        self.sprite_variants = sprite_variants or {}
+        self.screen_width, self.screen_height = screen_size
+        if isinstance(particle_properties, dict):
+            particle_properties = [particle_properties]
+
+        # Reparte las partículas a partes iguales entre las entradas de la configuración
+        counts = [total_particles // len(particle_properties)] * len(particle_properties)
+        for i in range(total_particles % len(particle_properties)):
+            counts[i] += 1
+
+        self.atlas = SpriteAtlas()
+        columns = {name: [] for name in ("x", "y", "velocity", "angle", "size", "base_size", "size_min", "size_max", "group", "color")}
+        self.sprite_base = []  # Índice del primer sprite de cada grupo
+        self.sprite_sizes = []  # Tamaños distintos por color en cada grupo
+        for group, (config, n) in enumerate(zip(particle_properties, counts)):
+            for name, values in self.create_group(group, config, n).items():
+                columns[name].append(values)
+
+        for name, values in columns.items():
+            setattr(self, name, np.concatenate(values) if values else np.zeros(0))
+        self.group = self.group.astype(np.int32)
+        self.color = self.color.astype(np.int32)
+        self.sprite_base = np.asarray(self.sprite_base, dtype=np.int32)
+        self.sprite_sizes = np.asarray(self.sprite_sizes, dtype=np.int32)
+        self.atlas.build()
+        # Partículas que se dibujan (None: todas); las demás siguen simulándose.
+        # Se eligen en orden aleatorio para no descartar grupos enteros
+        self.draw_order = self.rng.permutation(len(self.x))
+        self.active = None
+        # Reglas entre partículas de la clave "interactions"; sin ella cada una va por libre
+        self.interactions = None
+        if interactions:
+            max_size = max(group["size_max"] for group in particle_properties)
+            self.interactions = ParticleInteractions(interactions, screen_size, max_size)
+
+    def __len__(self):
+        return len(self.x)
+
+    def create_group(self, group, config, n):
+        size_min, size_max = config["size_min"], config["size_max"]
+        velocity_min, velocity_max = config["velocity_range"]
+        colors = self.get_colors(config["color"])
+        variants = self.sprite_variants.get(group)
+        image = self.get_image(config["src"]) if config.get("src") and not variants else None
+
+        self.sprite_base.append(len(self.atlas.offsets))
+        self.sprite_sizes.append(size_max - size_min + 1)
+        for color_index, color in enumerate(colors):
+            for size in range(size_min, size_max + 1):
+                if variants:
+                    sprite = variants[size - size_min]
+                    offset = (0, 0)
+                elif image:
+                    # Las imágenes se dibujan desde la esquina, como antes
+                    sprite = pygame.transform.smoothscale(image, (max(1, size), max(1, size)))
+                    offset = (0, 0)
+                else:
+                    sprite = pygame.Surface((2 * size + 1, 2 * size + 1), pygame.SRCALPHA)
+                    pygame.draw.circle(sprite, color, (size, size), size)
+                    offset = (-size, -size)
+                self.atlas.add((group, color_index, size), sprite, offset)
+
+        return {
+            "x": self.rng.integers(0, self.screen_width, n, endpoint=True).astype(np.float64),
+            "y": self.rng.integers(0, self.screen_height, n, endpoint=True).astype(np.float64),
+            "velocity": self.rng.uniform(velocity_min, velocity_max, n),
+            "angle": self.rng.uniform(0, 2 * math.pi, n),
+            "size": self.rng.integers(size_min, size_max, n, endpoint=True).astype(np.float64),
+            "base_size": self.rng.integers(size_min, size_max, n, endpoint=True).astype(np.float64),
+            "size_min": np.full(n, size_min, dtype=np.float64),
+            "size_max": np.full(n, size_max, dtype=np.float64),
+            "group": np.full(n, group),
+            "color": self.rng.integers(0, len(colors), n),
+        }
+
+    def get_colors(self, color_config):
+        if color_config == "random":
+            return [tuple(color) for color in self.rng.integers(0, 255, (RANDOM_PALETTE_SIZE, 3), endpoint=True).tolist()]
+        return [tuple(color_config)]
+
+    def get_image(self, src):
+        try:
+            image = pygame.image.load(src)  # Imagen sin escalar
+        except (pygame.error, FileNotFoundError):
+            return None
+        if pygame.display.get_surface() is not None:
+            return image.convert_alpha()
+        converted = pygame.Surface(image.get_size(), pygame.SRCALPHA)
+        converted.blit(image, (0, 0))
+        return converted
+
+    def update(self):
+        if self.interactions is not None and len(self.x):
+            self.interactions.apply(self)
+        self.x += np.cos(self.angle) * self.velocity
+        self.y += np.sin(self.angle) * self.velocity
+
+        # Rebote contra los bordes de la pantalla
+        bounce_x = (self.x < 0) | (self.x > self.screen_width)
+        self.angle[bounce_x] = math.pi - self.angle[bounce_x]
+        bounce_y = (self.y < 0) | (self.y > self.screen_height)
+        self.angle[bounce_y] = -self.angle[bounce_y]
+
+    def pulse_attraction(self):
+        if self.interactions is not None:
+            self.interactions.pulse()
+
+    def update_size(self, volume_level):
+        np.clip(self.base_size + (volume_level - 0.5) * 10, self.size_min, self.size_max, out=self.size)
+
+    def set_active_fraction(self, fraction):
+        count = int(round(len(self.x) * fraction))
+        self.active = None if count >= len(self.x) else np.sort(self.draw_order[:count])
+
+    def snapshot(self, timestamp):
+        return ParticleSnapshot(self.x.copy(), self.y.copy(), self.size.copy(), timestamp)
+
+    def sprite_indices(self, size, active=None):
+        size_min, group, color = self.size_min, self.group, self.color
+        if active is not None:
+            size_min, group, color = size_min[active], group[active], color[active]
+        sizes = size.astype(np.int32) - size_min.astype(np.int32)
+        return self.sprite_base[group] + color * self.sprite_sizes[group] + sizes
+
+    def draw(self, screen, state=None):
+        # Dibuja la capa completa en una sola llamada a Surface.blits, a partir de una
+        # instantánea o del estado actual, y devuelve los rectángulos dibujados
+        state = state or self
+        x, y, size, active = state.x, state.y, state.size, self.active
+        if active is not None:
+            x, y, size = x[active], y[active], size[active]
+        sprites = self.sprite_indices(size, active)
+        dest_x = x.astype(np.int32) + self.atlas.offset_x[sprites]
+        dest_y = y.astype(np.int32) + self.atlas.offset_y[sprites]
+        # Sin lista intermedia: zip entrega a blits cada tupla cuando la pide y la reutiliza
+        # en cuanto blits la suelta
+        blits = zip(itertools.repeat(self.atlas.surface), zip(dest_x.tolist(), dest_y.tolist()),
+                    map(self.atlas.rects.__getitem__, sprites.tolist()))
+        if len(sprites) <= MAX_DIRTY_RECTS:
+            return screen.blits(blits)
+        screen.blits(blits, doreturn=False)
+        left, top = int(dest_x.min()), int(dest_y.min())
+        right = int((dest_x + self.atlas.width[sprites]).max())
+        bottom = int((dest_y + self.atlas.height[sprites]).max())
+        return [pygame.Rect(left, top, right - left, bottom - top)]
+
+    def memory_usage(self):
+        arrays = (self.x, self.y, self.velocity, self.angle, self.size, self.base_size, self.size_min, self.size_max, self.group, self.color)
+        return sum(array.nbytes for array in arrays) + self.atlas.memory_usage()
+
+
+# Estado inmutable publicado por el simulador en cada paso
+ParticleSnapshot = collections.namedtuple("ParticleSnapshot", ["x", "y", "size", "time"])
+
+
+class SimulationWorker(threading.Thread):
+    # Un único hilo por carpeta que avanza la simulación a paso fijo. El render no
+    # toca los arrays del sistema: lee la pareja (anterior, actual) de instantáneas
+    # publicada de forma atómica e interpola las posiciones entre ambas.
+
+    def __init__(self, particles, tick_rate=50):
+        super().__init__()
+        self.particles = particles
+        self.tick = 1 / tick_rate
+        self.daemon = True
+        self.running = True
+        self.active = threading.Event()  # Sin activar, el hilo queda aparcado
+        self.commands = collections.deque()  # Cambios pedidos desde otros hilos
+        self.volume_level = None
+        snapshot = self.particles.snapshot(time.perf_counter())
+        self.snapshots = (snapshot, snapshot)
+
+    def run(self):
+        next_tick = time.perf_counter()
+        while self.running:
+            if not self.active.is_set():
+                self.active.wait()
+                next_tick = time.perf_counter()
+                continue
+
+            now = time.perf_counter()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                continue
+            while next_tick <= now:
+                self.step()
+                next_tick += self.tick
+            self.publish(next_tick - self.tick)
+
+    def step(self):
+        while self.commands:
+            command, args = self.commands.popleft()
+            command(*args)
+        if self.volume_level is not None:
+            self.particles.update_size(self.volume_level)
+        self.particles.update()
+
+    def publish(self, timestamp):
+        self.snapshots = (self.snapshots[1], self.particles.snapshot(timestamp))
+
+    def advance(self, timestamp):
+        # Paso síncrono, para quien mueve la simulación sin el hilo (benchmarks, render offline)
+        self.step()
+        self.publish(timestamp)
+
+    def set_volume(self, volume_level):
+        self.volume_level = volume_level
+
+    def submit(self, command, *args):
+        self.commands.append((command, args))
+
+    def interpolated(self, now=None):
+        previous, current = self.snapshots
+        if previous is current:
+            return current
+        now = time.perf_counter() if now is None else now
+        # Se dibuja un paso por detrás para interpolar siempre entre dos estados conocidos
+        alpha = min(1.0, max(0.0, (now - current.time) / self.tick))
+        return ParticleSnapshot(previous.x + (current.x - previous.x) * alpha,
+                                previous.y + (current.y - previous.y) * alpha,
+                                current.size, now)
+
+    def resume(self):
+        if not self.is_alive():
+            self.start()
+        self.active.set()
+
+    def park(self):
+        self.active.clear()
+
+    def stop(self):
+        self.running = False
+        self.active.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
@@ -0,0 +1,72 @@
+import collections
+import time
+
+# Gobernador de calidad: mide el tiempo de trabajo de cada fotograma y baja o
+# sube un nivel de calidad para mantener los FPS objetivo. Cada nivel fija la
+# resolución interna del fondo y la imagen central, la fracción de partículas
+# que se dibujan, el salto entre fotogramas de rotación del fondo y la
+# cuantización de la escala de la imagen central, y si se aplican los efectos
+# de píxel.
+
+QualityLevel = collections.namedtuple("QualityLevel", ["name", "render_scale", "particle_fraction", "angle_stride", "center_quantization",
+                                                   "effects"])
+
+QUALITY_LEVELS = (
+    QualityLevel("alta", 1.0, 1.0, 1, 1, True),
+    QualityLevel("media", 1.0, 0.6, 2, 2, True),
+    # Reducir el lienzo solo compensa a la mitad: a 0,75 ampliarlo cuesta más que lo que se ahorra
+    QualityLevel("baja", 1.0, 0.4, 3, 4, False),
+    QualityLevel("mínima", 0.5, 0.25, 4, 8, False),
+)
+
+
+class QualityGovernor:
+    def __init__(self, target_fps=30, levels=QUALITY_LEVELS, window=30, downgrade_ratio=0.9, upgrade_ratio=0.6,
+                 cooldown=2.0, level=0, adaptive=True):
+        self.levels = levels
+        self.budget = 1 / target_fps
+        self.samples = collections.deque(maxlen=window)
+        # Histéresis: se baja al acercarse al presupuesto y solo se sube con mucho margen
+        self.downgrade_ratio = downgrade_ratio
+        self.upgrade_ratio = upgrade_ratio
+        self.cooldown = cooldown  # Segundos mínimos entre dos cambios de nivel
+        self.index = level
+        self.adaptive = adaptive
+        self.last_change = time.perf_counter()
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def record(self, frame_seconds, now=None):
+        # Anota el tiempo de trabajo de un fotograma; devuelve True si cambia el nivel
+        self.samples.append(frame_seconds)
+        if not self.adaptive or len(self.samples) < self.samples.maxlen:
+            return False
+        now = time.perf_counter() if now is None else now
+        if now - self.last_change < self.cooldown:
+            return False
+
+        mean = sum(self.samples) / len(self.samples)
+        if mean > self.budget * self.downgrade_ratio and self.index < len(self.levels) - 1:
+            self.index += 1
+        elif mean < self.budget * self.upgrade_ratio and self.index > 0:
+            self.index -= 1
+        else:
+            return False
+        self.samples.clear()
+        self.last_change = now
+        return True
+
+    def report(self):
+        level = self.level
+        return (f"{level.name} ({self.index + 1}/{len(self.levels)}): resolución {level.render_scale:.0%}, "
+                f"partículas {level.particle_fraction:.0%}, salto de rotación {level.angle_stride}, "
+                f"escala central x{level.center_quantization}, efectos {'sí' if level.effects else 'no'}")
+
+
+def get_quality_level(name, levels=QUALITY_LEVELS):
+    for index, level in enumerate(levels):
+        if level.name == name:
+            return index
+    raise ValueError(f"Nivel de calidad desconocido: {name}")
@@ -0,0 +1,314 @@
+import argparse
+import collections
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from audio_analysis import AudioAnalyzer, RingBuffer
+from audio_sources import WavFileSource
+from compositor import Compositor
+from effects import EFFECTS, NO_EFFECT, EffectsPipeline, selected_effects
+from lightning import LightningManager
+from logger import configure as configure_logging, log_message
+from main import ImageFolder, apply_audio_features, get_folders_in_directory, get_max_workers
+from particles import ParticleSnapshot
+from ThunderEfect import TRANSITIONS, create_transition
+
+# Render sin conexión a una secuencia de imágenes numeradas. Reproduce el
+# bucle principal (carpetas, partículas, transiciones) con un reloj simulado y
+# el análisis del audio de un WAV, sin pantalla ni esperas, tan rápido como dé
+# la máquina:
+#
+#   python render.py cancion.wav images/Zeus images/Poseidon --output render
+#
+# La simulación es secuencial y se hace en este proceso, pero es barata: cada
+# fotograma queda descrito por un FrameState (fotograma de fondo, nivel de la
+# imagen central, posiciones de las partículas y parámetros de los efectos de
+# píxel) y se dibuja y se guarda en
+# otro proceso. Los fotogramas de las transiciones dependen del estado de la
+# propia transición (relámpagos, fotograma entrante) y se dibujan aquí.
+
+# Todo lo necesario para dibujar un fotograma sin simular nada
+FrameState = collections.namedtuple("FrameState", ["number", "folder", "background", "center", "particles", "effects"])
+
+RESIDENT_FOLDERS = 2  # Carpetas cargadas por proceso: la actual y la entrante
+
+
+class SimulatedAudio:
+    # Entrega a cada fotograma las muestras que corresponden a 1/fps segundos
+    def __init__(self, source, fps):
+        self.source = source
+        self.fps = fps
+        self.ring_buffer = RingBuffer(source.sample_rate * 2)
+        self.analyzer = AudioAnalyzer(source.sample_rate)
+        self.pending = 0.0
+        self.time = 0.0
+        self.sensitivity = 1.5
+
+    def next_features(self):
+        self.pending += self.source.sample_rate / self.fps
+        while self.pending >= self.source.block_size:
+            block = self.source.read_block()
+            if block is None:
+                break
+            self.ring_buffer.write(block)
+            self.pending -= self.source.block_size
+        self.time += 1 / self.fps
+        features = self.analyzer.analyze(self.ring_buffer, now=self.time)
+        return features._replace(volume=features.peak * 3 * self.sensitivity)
+
+
+class ResidentFolders:
+    # Carpetas cargadas en un proceso, en orden LRU. Con la misma semilla, la
+    # carpeta de un proceso de dibujo es idéntica a la del simulador
+    def __init__(self, screen_size, seed, on_load=None, size=RESIDENT_FOLDERS):
+        self.screen_size = screen_size
+        self.seed = seed
+        self.on_load = on_load
+        self.size = size
+        self.folders = collections.OrderedDict()
+
+    def get(self, path):
+        folder = self.folders.get(path)
+        if folder is None:
+            folder = self.folders[path] = ImageFolder(path, self.screen_size, seed=self.seed)
+            if self.on_load is not None:
+                self.on_load(folder)
+            while len(self.folders) > self.size:
+                self.folders.popitem(last=False)
+        self.folders.move_to_end(path)
+        return folder
+
+
+def draw_state(compositor, folder, state, overlays=()):
+    # Misma composición que en directo, a partir del estado en lugar de la animación de la carpeta
+    compositor.use_folder(folder)
+    return compositor.draw(folder.rotated_images[state.background], folder.center_images[state.center],
+                           lambda surface: folder.particles.draw(surface, state.particles), overlays, full=True,
+                           effect_params=state.effects)
+
+
+class FrameWriter:
+    def __init__(self, output, image_format, screen_size, get_folder, effects=()):
+        self.output = output
+        self.image_format = image_format
+        self.get_folder = get_folder
+        self.surface = pygame.Surface(screen_size)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        self.compositor = Compositor(self.surface)
+        # Solo aplica los parámetros que trae cada FrameState
+        self.compositor.effects = EffectsPipeline(screen_size, effects) if effects else None
+
+    def frame_path(self, number):
+        return os.path.join(self.output, f"frame_{number:06d}.{self.image_format}")
+
+    def save(self, number):
+        pygame.image.save(self.surface, self.frame_path(number))
+
+    def write(self, states):
+        for state in states:
+            draw_state(self.compositor, self.get_folder(state.folder), state)
+            self.save(state.number)
+        return len(states)
+
+
+def open_display(screen_size):
+    # Pantalla ficticia: las superficies se convierten al mismo formato que en directo
+    pygame.display.init()
+    pygame.display.set_mode(screen_size)
+
+
+# Proceso de dibujo: cada uno carga sus propias carpetas y escribe los fotogramas que recibe
+worker_writer = None
+
+
+def init_worker(output, image_format, screen_size, seed, effects):
+    global worker_writer
+    open_display(screen_size)
+    worker_writer = FrameWriter(output, image_format, screen_size, ResidentFolders(screen_size, seed).get, effects)
+
+
+def write_frames(states):
+    return worker_writer.write(states)
+
+
+class OfflineRenderer:
+    def __init__(self, wav_path, folder_paths, output, fps=30, screen_size=(800, 600), folder_seconds=5.0,
+                 transition_name="lightning", workers=None, seed=0, image_format="png", chunk_size=8, duration=None,
+                 effects=()):
+        self.folder_paths = folder_paths
+        self.output = output
+        self.fps = fps
+        self.screen_size = screen_size
+        self.transition_time = folder_seconds * 1000
+        self.transition_name = transition_name
+        self.workers = get_max_workers() if workers is None else workers
+        self.seed = seed
+        self.image_format = image_format
+        self.chunk_size = chunk_size
+        self.effects = tuple(effects)
+
+        self.source = WavFileSource(wav_path, realtime=False, loop=False)
+        seconds = len(self.source.samples) / self.source.sample_rate
+        if duration is not None:
+            seconds = min(seconds, duration)
+        self.total_frames = int(seconds * fps)
+
+        self.now = 0.0  # Reloj simulado en milisegundos
+        self.next_ticks = {}  # Siguiente paso de simulación de cada carpeta, en segundos
+        self.last_frames = {}  # Último fotograma en el que avanzó cada carpeta
+        self.folders = ResidentFolders(screen_size, seed, on_load=self.prepare_folder)
+
+    def ticks(self):
+        return int(self.now)
+
+    def prepare_folder(self, folder):
+        folder.get_ticks = self.ticks
+        self.next_ticks.pop(folder.path, None)
+
+    def folder_state(self, folder, number, effects=NO_EFFECT):
+        # Avanza la simulación de partículas hasta el reloj simulado y describe el fotograma
+        worker = folder.particle_thread
+        now = self.now / 1000
+        next_tick = self.next_ticks.get(folder.path)
+        if next_tick is None or self.last_frames.get(folder.path) != number - 1:
+            # Como al reanudar el simulador: la carpeta no se pone al día del tiempo sin mostrarse
+            next_tick = now
+        while next_tick <= now:
+            worker.advance(next_tick)
+            next_tick += worker.tick
+        self.next_ticks[folder.path] = next_tick
+        self.last_frames[folder.path] = number
+
+        background = folder.next_background_index()
+        center = folder.center_index(folder.next_center_position())
+        snapshot = worker.interpolated(now)
+        particles = ParticleSnapshot(snapshot.x.astype(np.float32), snapshot.y.astype(np.float32),
+                                     snapshot.size.astype(np.float32), snapshot.time)
+        return FrameState(number, folder.path, background, center, particles, effects)
+
+    def run(self):
+        os.makedirs(self.output, exist_ok=True)
+        open_display(self.screen_size)
+        writer = FrameWriter(self.output, self.image_format, self.screen_size, self.folders.get, self.effects)
+        # SDL no sobrevive a un fork: los procesos de dibujo arrancan desde cero
+        executor = None
+        if self.workers > 0:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker,
+                initargs=(self.output, self.image_format, self.screen_size, self.seed, self.effects))
+
+        width, height = self.screen_size
+        lightning_manager = LightningManager(width, height, 7, seed=self.seed)  # Sin hilo: se llena antes de cada transición
+        transition = create_transition(self.transition_name, writer.surface, lightning_manager)
+        incoming_frame = pygame.Surface(self.screen_size).convert() if transition.needs_incoming_frame else None
+        incoming_compositor = Compositor(incoming_frame) if incoming_frame is not None else None
+        audio = SimulatedAudio(self.source, self.fps)
+        # Los parámetros de los efectos dependen del audio anterior: se calculan aquí, en orden
+        effects_planner = EffectsPipeline(self.screen_size, self.effects) if self.effects else None
+
+        index = 0
+        folder = self.folders.get(self.folder_paths[index])
+        time_since_last_change = 0
+        pending = collections.deque()
+        chunk = []
+        written = 0
+        start = time.perf_counter()
+        last_report = start
+        try:
+            for number in range(self.total_frames):
+                self.now = number * 1000 / self.fps
+                if number:
+                    time_since_last_change += 1000 / self.fps
+
+                if time_since_last_change >= self.transition_time and not transition.active and len(self.folder_paths) > 1:
+                    next_folder = self.folders.get(self.folder_paths[(index + 1) % len(self.folder_paths)])
+                    if incoming_compositor is not None:
+                        draw_state(incoming_compositor, next_folder, self.folder_state(next_folder, number))
+                    if self.transition_name == "lightning":
+                        while len(lightning_manager.pool) < lightning_manager.pool_size:
+                            lightning_manager.generate()
+                    transition.start(incoming_frame, now=self.now)
+                if transition.update(now=self.now):
+                    index = (index + 1) % len(self.folder_paths)
+                    folder = self.folders.get(self.folder_paths[index])
+                    time_since_last_change = 0
+
+                features = audio.next_features()
+                apply_audio_features(folder, features)
+                effects = effects_planner.update(features) if effects_planner is not None else NO_EFFECT
+                state = self.folder_state(folder, number, effects)
+                if transition.active or executor is None:
+                    draw_state(writer.compositor, folder, state, (lambda surface: transition.draw(surface, now=self.now),))
+                    writer.save(number)
+                    written += 1
+                else:
+                    chunk.append(state)
+                    if len(chunk) >= self.chunk_size:
+                        pending.append(executor.submit(write_frames, chunk))
+                        chunk = []
+                    # Como mucho dos tandas por proceso en vuelo, para no acumular estados en memoria
+                    while len(pending) > 2 * self.workers:
+                        written += pending.popleft().result()
+
+                if time.perf_counter() - last_report >= 5:
+                    last_report = time.perf_counter()
+                    log_message(f"Render: {number + 1}/{self.total_frames} fotogramas simulados, {written} guardados")
+
+            if chunk:
+                pending.append(executor.submit(write_frames, chunk))
+            while pending:
+                written += pending.popleft().result()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - start
+        video_seconds = self.total_frames / self.fps
+        log_message(f"Render terminado: {written} fotogramas en {elapsed:.1f} s "
+                    f"({written / max(elapsed, 1e-9):.1f} FPS, x{video_seconds / max(elapsed, 1e-9):.2f} tiempo real) en [{self.output}]")
+        pygame.quit()
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render sin conexión a una secuencia de imágenes numeradas")
+    parser.add_argument("wav", help="Fichero WAV que dirige la visualización")
+    parser.add_argument("folders", nargs="*", help="Carpetas en el orden en que se muestran (por defecto, images/)")
+    parser.add_argument("--output", default="render", help="Directorio de salida")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600])
+    parser.add_argument("--folder-seconds", type=float, default=5.0, help="Segundos por carpeta antes de la transición")
+    parser.add_argument("--transition", default="lightning", choices=sorted(TRANSITIONS))
+    parser.add_argument("--workers", type=int, help="Procesos de dibujo; 0 dibuja en este proceso")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de partículas y relámpagos")
+    parser.add_argument("--format", default="png", choices=["png", "jpg", "bmp", "tga"])
+    parser.add_argument("--duration", type=float, help="Segundos a renderizar (por defecto, todo el WAV)")
+    parser.add_argument("--effects", nargs="*", choices=EFFECTS,
+                        help="Activa efectos de píxel; sin valores, todos")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+    configure_logging(getattr(logging, args.log_level))
+
+    folder_paths = args.folders or sorted(get_folders_in_directory("images"))
+    if not folder_paths:
+        log_message("No se encontraron carpetas de imágenes.", logging.ERROR)
+        return 1
+    renderer = OfflineRenderer(args.wav, folder_paths, args.output, fps=args.fps, screen_size=tuple(args.size),
+                               folder_seconds=args.folder_seconds, transition_name=args.transition, workers=args.workers,
+                               seed=args.seed, image_format=args.format, duration=args.duration,
+                               effects=selected_effects(args.effects))
+    renderer.run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+import collections
+
+import pygame
+
+from frames import fit_scale
+
+# Estrategias de rotación del fondo, elegidas por carpeta con la clave opcional
+# "rotation" de particles_config.json:
+#
+#   "rotation": {"mode": "on_demand", "cache_size": 32, "keyframe_step": 8}
+#
+# - "precomputed": todos los fotogramas se generan al cargar (por defecto).
+# - "on_demand": solo se guarda la imagen base ya escalada, en el formato de la
+#   pantalla; cada ángulo se genera con pygame.transform.rotozoom la primera
+#   vez que se pide y se conservan los 'cache_size' más recientes.
+# - "hybrid": fotogramas clave cada 'keyframe_step' generados al cargar, como
+#   en "precomputed", y los intermedios bajo demanda.
+#
+# RotationFrames se indexa por paso de rotación igual que una lista de
+# fotogramas, así que quien la usa no sabe qué estrategia tiene la carpeta.
+
+# Fotograma rotado del fondo recortado a su contenido y su posición en pantalla
+RotatedImage = collections.namedtuple("RotatedImage", ["surface", "offset"])
+
+ROTATION_MODES = ("precomputed", "on_demand", "hybrid")
+DEFAULT_ROTATION = {"mode": "precomputed", "cache_size": 32, "keyframe_step": 8}
+
+
+def validate_rotation(config, invalid):
+    # 'invalid' construye la excepción con el contexto de la carpeta
+    if not isinstance(config, dict):
+        raise invalid("'rotation' debe ser un objeto")
+    for key in config:
+        if key not in DEFAULT_ROTATION:
+            raise invalid(f"opción de rotación desconocida: '{key}'")
+    rotation = dict(DEFAULT_ROTATION, **config)
+    if rotation["mode"] not in ROTATION_MODES:
+        raise invalid(f"'rotation.mode' debe ser uno de: {', '.join(ROTATION_MODES)}")
+    for key in ("cache_size", "keyframe_step"):
+        value = rotation[key]
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise invalid(f"'rotation.{key}' debe ser un entero positivo")
+    return rotation
+
+
+def keyframe_indices(rotation, count):
+    # Fotogramas (de los 'count' ángulos únicos) que se generan al cargar
+    if rotation["mode"] == "precomputed":
+        return list(range(count))
+    if rotation["mode"] == "hybrid":
+        return list(range(0, count, rotation["keyframe_step"]))
+    return []
+
+
+def surface_bytes(surface):
+    return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+
+class RotationFrames:
+    # Solo la usa el hilo principal; memory_usage() se puede llamar desde otros
+    # porque no recorre la caché
+
+    def __init__(self, angles, index, keyframes, screen_size, base=None, cache_size=DEFAULT_ROTATION["cache_size"]):
+        self.angles = angles  # Ángulo de cada fotograma único
+        self.index = index  # Fotograma que representa cada paso de rotación
+        self.keyframes = keyframes  # Fotograma -> RotatedImage generado al cargar
+        self.screen_size = screen_size
+        self.base = base  # Imagen sin rotar para los fotogramas bajo demanda
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()  # Fotograma -> RotatedImage, en orden LRU
+        self.cached_bytes = 0
+        surfaces = {id(image.surface): image.surface for image in keyframes.values()}
+        if base is not None:
+            surfaces[id(base)] = base
+        self.fixed_bytes = sum(surface_bytes(surface) for surface in surfaces.values())
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, step):
+        frame = self.index[step]
+        image = self.keyframes.get(frame)
+        if image is not None:
+            return image
+        image = self.cache.get(frame)
+        if image is not None:
+            self.cache.move_to_end(frame)
+            return image
+
+        image = self.cache[frame] = self.render(self.angles[frame])
+        self.cached_bytes += surface_bytes(image.surface)
+        while len(self.cache) > self.cache_size:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= surface_bytes(evicted.surface)
+        return image
+
+    def render(self, angle):
+        # Misma escala y posición que render_rotated_frame, sin recortar las esquinas
+        surface = pygame.transform.rotozoom(self.base, angle, fit_scale(self.base.get_size(), angle, self.screen_size))
+        width, height = surface.get_size()
+        screen_width, screen_height = self.screen_size
+        return RotatedImage(surface, (int((screen_width - width) / 2), int((screen_height - height) / 2)))
+
+    def memory_usage(self):
+        return self.fixed_bytes + self.cached_bytes
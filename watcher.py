@@ -0,0 +1,77 @@
+import os
+import threading
+
+from logger import log_message
+
+# Vigilante del directorio de escenas por sondeo: cada 'interval' segundos
+# compara el tamaño y la fecha de los ficheros de cada carpeta con la pasada
+# anterior y avisa de las carpetas nuevas, modificadas o eliminadas. Una
+# carpeta solo se notifica cuando no ha cambiado entre dos pasadas seguidas,
+# para no cargarla a medio copiar. Los ficheros que genera el propio programa
+# (paquetes de escena) no cuentan.
+
+IGNORED_PREFIXES = ("scene.visb", ".")
+
+
+def folder_signature(folder_path):
+    signature = []
+    for entry in sorted(os.scandir(folder_path), key=lambda entry: entry.name):
+        if entry.name.startswith(IGNORED_PREFIXES) or not entry.is_file():
+            continue
+        stat = entry.stat()
+        signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def scan_directory(directory):
+    signatures = {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return signatures
+    for entry in entries:
+        if entry.is_dir() and not entry.name.startswith("."):
+            folder_path = os.path.join(directory, entry.name)
+            try:
+                signatures[folder_path] = folder_signature(folder_path)
+            except OSError:
+                # Carpeta eliminada a mitad del recorrido
+                continue
+    return signatures
+
+
+class FolderWatcher(threading.Thread):
+    def __init__(self, directory, on_change, interval=2.0):
+        super().__init__()
+        self.directory = directory
+        self.on_change = on_change  # on_change(nuevas, modificadas, eliminadas)
+        self.interval = interval
+        self.daemon = True
+        self.stopped = threading.Event()
+        self.signatures = scan_directory(directory)  # Último estado notificado
+        self.last_scan = dict(self.signatures)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        current = scan_directory(self.directory)
+        previous, self.last_scan = self.last_scan, current
+        # Las carpetas que siguen cambiando se revisan en la siguiente pasada
+        stable = {path: signature for path, signature in current.items() if previous.get(path) == signature}
+        added = sorted(path for path in stable if path not in self.signatures)
+        changed = sorted(path for path in stable if path in self.signatures and stable[path] != self.signatures[path])
+        removed = sorted(path for path in self.signatures if path not in current)
+        for path in added + changed:
+            self.signatures[path] = stable[path]
+        for path in removed:
+            del self.signatures[path]
+        if added or changed or removed:
+            log_message(f"Cambios en [{self.directory}]", nuevas=len(added), modificadas=len(changed), eliminadas=len(removed))
+            self.on_change(added, changed, removed)
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()